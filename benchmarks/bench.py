@@ -0,0 +1,189 @@
+"""Runs clip9 end to end against a FakeTwitch server and reports how long
+it took, the requests and bytes it sent, and its peak memory.
+
+Usage:
+    python benchmarks/bench.py --users 10 --clips 200 [clip9 args...]
+
+Arguments that bench.py doesn't know are passed on to clip9, e.g.
+--pipeline or --download_workers 8.  The report is printed as JSON.
+"""
+
+from argparse import ArgumentParser
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                '../clip9')))
+
+import twitch.api.base
+import twitch.constants
+
+import clip9
+import clipget
+import clipsplice
+import constants
+import httpsession
+import oauthtoken
+from faketwitch import DEFAULT_RATE_LIMIT, FakeTwitch, make_payload
+
+def _parse_args():
+    parser = ArgumentParser(description="Runs clip9 against a local fake "
+                            "Twitch server and reports its performance.")
+    parser.add_argument('-u', '--users',
+                        action='store',
+                        type=int,
+                        default=10,
+                        help="Number of users in the team.")
+    parser.add_argument('-n', '--clips',
+                        action='store',
+                        type=int,
+                        default=100,
+                        help="Number of clips of each user.")
+    parser.add_argument('--latency',
+                        action='store',
+                        type=float,
+                        default=0.05,
+                        help="Seconds the server waits before answering "
+                             "each request.")
+    parser.add_argument('--rate_limit',
+                        action='store',
+                        type=int,
+                        default=DEFAULT_RATE_LIMIT,
+                        help="Helix points per minute of the server.")
+    parser.add_argument('--clip_seconds',
+                        action='store',
+                        type=float,
+                        default=2,
+                        help="Length of the synthetic clip served for "
+                             "every clip.")
+    parser.add_argument('--payload',
+                        action='store',
+                        help="mp4 file to serve for every clip instead of "
+                             "a synthetic one.")
+    parser.add_argument('--seed',
+                        action='store',
+                        type=int,
+                        default=0,
+                        help="Seed of the generated view counts.")
+    parser.add_argument('--output_format',
+                        action='store',
+                        choices=['mp4', 'ogv', 'webm', 'avi'],
+                        default='mp4',
+                        help="Format of the video clip9 makes.")
+    parser.add_argument('--work_dir',
+                        action='store',
+                        help="Directory for the clips, output, and logs.  "
+                             "Default is a temporary directory.")
+    parser.add_argument('--report',
+                        action='store',
+                        help="File to also write the JSON report into.")
+    return parser.parse_known_args()
+
+def _patch_urls(base_url):
+    """Points clip9 and python-twitch-client at the fake server."""
+    urls = {
+        'BASE_HELIX_URL': f'{base_url}/helix',
+        'BASE_KRAKEN_URL': f'{base_url}/kraken',
+        'BASE_GQL_URL': f'{base_url}/gql',
+        'BASE_OAUTH2_URL': f'{base_url}/oauth2',
+    }
+    for module in (constants, clipget, clipsplice, httpsession, oauthtoken):
+        for name, url in urls.items():
+            if hasattr(module, name):
+                setattr(module, name, url)
+
+    # python-twitch-client binds its base URL as a default argument
+    kraken_url = f'{base_url}/kraken/'
+    old_url = twitch.constants.BASE_URL
+    twitch.constants.BASE_URL = kraken_url
+    twitch.api.base.BASE_URL = kraken_url
+    for method in ('_request_get', '_request_post', '_request_put',
+                   '_request_delete'):
+        func = getattr(twitch.api.base.TwitchAPI, method)
+        func.__defaults__ = tuple(kraken_url if value == old_url else value
+                                  for value in func.__defaults__)
+
+def _write_credentials(work_dir):
+    """Writes a credentials.cfg where clip9.main() looks for it and
+    returns the path to pass as sys.argv[0].
+    """
+    with open(os.path.join(work_dir, 'credentials.cfg'), 'w') as f:
+        f.write("[credentials]\n"
+                "TWITCH_CLIENT_ID=benchclientid\n"
+                "TWITCH_CLIENT_SECRET=benchclientsecret\n")
+    bin_dir = os.path.join(work_dir, 'bin')
+    os.makedirs(bin_dir, exist_ok=True)
+    return os.path.join(bin_dir, 'clip9.py')
+
+def run(args, clip9_args, work_dir):
+    """Runs clip9 against a FakeTwitch server and returns the report."""
+    if args.payload is not None:
+        with open(args.payload, 'rb') as f:
+            payload = f.read()
+    else:
+        payload = make_payload(duration=args.clip_seconds)
+    server = FakeTwitch(args.users, args.clips, payload,
+                        latency=args.latency, rate_limit=args.rate_limit,
+                        seed=args.seed)
+    server.start()
+    _patch_urls(server.url)
+
+    clips_dir = os.path.join(work_dir, 'clips')
+    os.makedirs(clips_dir, exist_ok=True)
+    output_file = os.path.join(work_dir, f'result.{args.output_format}')
+    sys.argv = [_write_credentials(work_dir), output_file, 'benchteam',
+                '--clips_dir', clips_dir,
+                '--log_file', os.path.join(work_dir, 'clip9.log'),
+                *clip9_args]
+    start_time = time.perf_counter()
+    try:
+        clip9.main()
+    finally:
+        wall_time = time.perf_counter() - start_time
+        server.stop()
+    logging.shutdown()
+
+    return {
+        'users': args.users,
+        'clips_per_user': args.clips,
+        'latency': args.latency,
+        'clip9_args': clip9_args,
+        'wall_time': wall_time,
+        'requests': server.stats['requests'],
+        'total_requests': sum(server.stats['requests'].values()),
+        'connections': server.stats['connections'],
+        'rate_limited': server.stats['rate_limited'],
+        'bytes_sent': server.stats['bytes_sent'],
+        'bytes_received': server.stats['bytes_received'],
+        'output_bytes': (os.path.getsize(output_file)
+                         if os.path.exists(output_file) else 0),
+        # ru_maxrss is in KiB on Linux.  The fake server runs in this
+        # process, so peak_rss_kb includes one copy of the payload.
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'peak_child_rss_kb': resource.getrusage(
+            resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+def main():
+    """Runs the benchmark and prints the report."""
+    args, clip9_args = _parse_args()
+    if args.work_dir is not None:
+        os.makedirs(args.work_dir, exist_ok=True)
+        report = run(args, clip9_args, args.work_dir)
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            report = run(args, clip9_args, work_dir)
+
+    report_json = json.dumps(report, indent=2)
+    print(report_json)
+    if args.report is not None:
+        with open(args.report, 'w') as f:
+            f.write(report_json + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+"""Module for the FakeTwitch server, a local stand-in for the Twitch
+endpoints clip9 talks to.
+
+Serves the OAuth2 token, validate, and revoke endpoints, the Helix clips
+and videos endpoints, the Kraken teams endpoint, the GQL clip source URL
+operation, and a clip CDN.  Every clip is the same synthetic mp4 payload.
+The users, videos, and clips are generated from a seed, so the same
+arguments always serve the same data.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import math
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from timestamps import format_timestamp, parse_timestamp
+
+DEFAULT_RATE_LIMIT = 800  # Helix points per minute
+FIRST_CLIP_TIME = parse_timestamp('2019-08-19T00:00:00Z')
+CLIP_INTERVAL = 600  # Seconds between the clips of a user
+CLIPS_PER_VIDEO = 10  # Number of clips created from each video
+
+def make_payload(duration=2, size=(1920, 1080), fps=30):
+    """Returns the bytes of a synthetic h264/aac mp4 clip made by ffmpeg.
+    The default size matches clip9's target resolution, so the clips can
+    be joined by stream copy like real Twitch clips.
+
+    :param duration: Length of the clip in seconds.
+    :param size: (width, height) of the clip.
+    :param fps: Frame rate of the clip.
+    """
+    from moviepy.config import get_setting
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, 'payload.mp4')
+        subprocess.run(
+            [get_setting('FFMPEG_BINARY'), '-y', '-v', 'error',
+             '-f', 'lavfi', '-i',
+             f'testsrc=duration={duration}:size={size[0]}x{size[1]}:'
+             f'rate={fps}',
+             '-f', 'lavfi', '-i', f'sine=duration={duration}',
+             '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt',
+             'yuv420p', '-c:a', 'aac', '-ac', '2',
+             '-shortest', file_name], check=True)
+        with open(file_name, 'rb') as f:
+            return f.read()
+
+class FakeTwitch(ThreadingHTTPServer):
+    """A local HTTP server that answers like the Twitch endpoints used by
+    clip9, and counts the requests and bytes it serves.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, num_users, num_clips, payload, latency=0.0,
+                 rate_limit=DEFAULT_RATE_LIMIT, seed=0, port=0):
+        """Initializes a new FakeTwitch
+
+        :param num_users: Number of users in every team.
+        :param num_clips: Number of clips of each user.
+        :param payload: Bytes of the mp4 served for every clip.
+        :param latency: Seconds to wait before answering each request.
+        :param rate_limit: Helix points per minute.  Helix requests over
+                           the limit get a 429.
+        :param seed: Seed of the generated view counts.
+        :param port: Port to listen on.  Default is any free port.
+        """
+        super().__init__(('127.0.0.1', port), _FakeTwitchHandler)
+        self.num_users = num_users
+        self.num_clips = num_clips
+        self.payload = payload
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.users = [{'_id': str(1000 + i), 'name': f'user{i}',
+                       'display_name': f'User{i}'}
+                      for i in range(num_users)]
+        self.clips, self.video_views = self._make_clips(seed)
+        self.clips_by_id = {clip['id']: clip
+                            for user_clips in self.clips.values()
+                            for clip in user_clips}
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_points = 0
+        self.stats = {'requests': {}, 'bytes_sent': 0, 'bytes_received': 0,
+                      'connections': 0, 'rate_limited': 0}
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL of the server, e.g. http://127.0.0.1:8080"""
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def _make_clips(self, seed):
+        """Returns a dictionary of user IDs to lists of clips, most viewed
+        first like Helix returns them, and a dictionary of video IDs to
+        view counts.  Clips with the same view count are newest first.
+        """
+        rng = random.Random(seed)
+        clips = {}
+        video_views = {}
+        for user in self.users:
+            user_clips = []
+            for i in range(self.num_clips):
+                video_id = ''
+                if i % CLIPS_PER_VIDEO != CLIPS_PER_VIDEO - 1:
+                    video_id = f'{user["_id"]}{i // CLIPS_PER_VIDEO:06d}'
+                    video_views.setdefault(video_id,
+                                           rng.randint(100, 20000))
+                user_clips.append({
+                    'id': f'Clip{user["_id"]}x{i}',
+                    'url': '',
+                    'embed_url': '',
+                    'broadcaster_id': user['_id'],
+                    'broadcaster_name': user['display_name'],
+                    'creator_id': '1',
+                    'creator_name': 'creator',
+                    'video_id': video_id,
+                    'game_id': '1',
+                    'language': 'en',
+                    'title': f'Clip {i} of {user["name"]}',
+                    'view_count': rng.randint(0, 2000),
+                    'created_at': format_timestamp(FIRST_CLIP_TIME
+                                                   + i * CLIP_INTERVAL),
+                    'thumbnail_url': '',
+                    'duration': 30.0,
+                })
+            user_clips.sort(key=lambda clip: (clip['view_count'],
+                                              clip['created_at']),
+                            reverse=True)
+            clips[user['_id']] = user_clips
+        return clips, video_views
+
+    def count(self, endpoint, bytes_sent, bytes_received):
+        """Counts a request to an endpoint."""
+        with self._lock:
+            requests = self.stats['requests']
+            requests[endpoint] = requests.get(endpoint, 0) + 1
+            self.stats['bytes_sent'] += bytes_sent
+            self.stats['bytes_received'] += bytes_received
+
+    def count_connection(self):
+        """Counts a new connection."""
+        with self._lock:
+            self.stats['connections'] += 1
+
+    def take_helix_point(self):
+        """Takes a point of the Helix rate limit.
+
+        :returns: A tuple of whether the request is allowed and the
+                  Ratelimit headers to answer with.
+        """
+        with self._lock:
+            now = time.time()
+            if now - self._window_start >= 60:
+                self._window_start = now
+                self._window_points = 0
+            allowed = self._window_points < self.rate_limit
+            if allowed:
+                self._window_points += 1
+            else:
+                self.stats['rate_limited'] += 1
+            headers = {
+                'Ratelimit-Limit': str(self.rate_limit),
+                'Ratelimit-Remaining': str(self.rate_limit
+                                           - self._window_points),
+                'Ratelimit-Reset': str(math.ceil(self._window_start + 60)),
+            }
+            return allowed, headers
+
+    def start(self):
+        """Serves requests in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving requests."""
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+class _FakeTwitchHandler(BaseHTTPRequestHandler):
+    """Answers a request to FakeTwitch."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.count_connection()
+
+    def log_message(self, format, *args):
+        logging.debug("FakeTwitch: " + format, *args)
+
+    def _send(self, endpoint, status, body=b'', headers=None):
+        """Sends a response and counts it."""
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers = {'Content-Type': 'application/json', **(headers or {})}
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        received = int(self.headers.get('Content-Length', 0))
+        self.server.count(endpoint, len(body), received)
+
+    def _read_body(self):
+        """Returns the body of the request."""
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        if url.path == '/oauth2/validate':
+            self._send('oauth2/validate', 200, {'client_id': 'bench',
+                                                'scopes': [],
+                                                'expires_in': 3600})
+        elif url.path.startswith('/kraken/teams/'):
+            self._send('kraken/teams', 200, {
+                '_id': 1,
+                'name': url.path.rsplit('/', 1)[1],
+                'display_name': 'Bench Team',
+                'users': self.server.users,
+            })
+        elif url.path == '/helix/clips':
+            self._helix('helix/clips', self._get_clips, params)
+        elif url.path == '/helix/videos':
+            self._helix('helix/videos', self._get_videos, params)
+        elif url.path.startswith('/cdn/'):
+            self._get_cdn()
+        else:
+            self._send('unknown', 404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        body = self._read_body()
+        url = urlsplit(self.path)
+        if url.path == '/oauth2/token':
+            self._send('oauth2/token', 200, {'access_token': 'benchtoken',
+                                             'expires_in': 3600,
+                                             'token_type': 'bearer'})
+        elif url.path == '/oauth2/revoke':
+            self._send('oauth2/revoke', 200)
+        elif url.path == '/gql':
+            self._send('gql', 200, [self._get_clip_src_url(operation)
+                                    for operation in json.loads(body)])
+        else:
+            self._send('unknown', 404, {'message': 'Not Found'})
+
+    def _helix(self, endpoint, get_data, params):
+        """Answers a Helix request within the rate limit."""
+        allowed, headers = self.server.take_helix_point()
+        if not allowed:
+            self._send(endpoint, 429, {'message': 'Too Many Requests'},
+                       headers)
+            return
+        self._send(endpoint, 200, get_data(params), headers)
+
+    def _get_clips(self, params):
+        """Returns a page of clips like Get Clips."""
+        if 'id' in params:
+            return {'data': [self.server.clips_by_id[clip_id]
+                             for clip_id in params['id']
+                             if clip_id in self.server.clips_by_id],
+                    'pagination': {}}
+        clips = self.server.clips.get(params['broadcaster_id'][0], [])
+        if 'started_at' in params:
+            started_at = parse_timestamp(params['started_at'][0])
+            ended_at = float('inf')
+            if 'ended_at' in params:
+                ended_at = parse_timestamp(params['ended_at'][0])
+            clips = [clip for clip in clips
+                     if started_at <= parse_timestamp(clip['created_at'])
+                     < ended_at]
+        first = int(params.get('first', ['20'])[0])
+        start = int(params.get('after', ['0'])[0])
+        page = {'data': clips[start:start + first], 'pagination': {}}
+        if start + first < len(clips):
+            page['pagination']['cursor'] = str(start + first)
+        return page
+
+    def _get_videos(self, params):
+        """Returns videos like Get Videos."""
+        return {'data': [{'id': video_id,
+                          'view_count': self.server.video_views[video_id],
+                          'created_at': '2019-08-19T00:00:00Z'}
+                         for video_id in params.get('id', [])
+                         if video_id in self.server.video_views]}
+
+    def _get_clip_src_url(self, operation):
+        """Returns the result of a VideoAccessToken_Clip operation."""
+        clip_id = operation['variables']['slug']
+        if clip_id not in self.server.clips_by_id:
+            return {'data': {'clip': None}}
+        return {'data': {'clip': {'videoQualities': [
+            {'sourceURL': f'{self.server.url}/cdn/{clip_id}.mp4'}]}}}
+
+    def _get_cdn(self):
+        """Sends the payload, or the requested range of it."""
+        payload = self.server.payload
+        range_header = self.headers.get('Range')
+        if range_header is None or not range_header.startswith('bytes='):
+            self._send('cdn', 200, payload,
+                       {'Content-Type': 'binary/octet-stream'})
+            return
+        start = int(range_header[len('bytes='):].split('-')[0])
+        if start >= len(payload):
+            self._send('cdn', 416, headers={
+                'Content-Range': f'bytes */{len(payload)}'})
+            return
+        self._send('cdn', 206, payload[start:], {
+            'Content-Type': 'binary/octet-stream',
+            'Content-Range': f'bytes {start}-{len(payload) - 1}/'
+                             f'{len(payload)}',
+        })
@@ -10,8 +10,15 @@ import sys
 import time
 
 from clipget import ClipGetter
+from clipindex import ClipIndex
+from clipselect import select_clips
 from clipsplice import ClipSplicer
+from encoding import DEFAULT_PROFILE, PROFILES
+from httpsession import create_session
+from metrics import Metrics
 from oauthtoken import OauthToken
+from ratelimit import RateLimiter
+from viewcache import DEFAULT_TTL, ViewCountCache
 from teamusers import TeamUsers
 
 def handle_exception(ex_type, value, traceback):
@@ -44,11 +51,125 @@ def _parse_args():
                         action='store',
                         default='./',
                         help="Directory to download the clips into.")
+    parser.add_argument('-f', '--fetch_workers',
+                        action='store',
+                        type=int,
+                        default=4,
+                        help="Maximum number of users to get clips for at "
+                             "once.")
+    parser.add_argument('-m', '--max_user_clips',
+                        action='store',
+                        type=int,
+                        help="Maximum number of clips to get for each user.  "
+                             "Default is all clips in the timeframe.")
+    parser.add_argument('-D', '--max_duration',
+                        action='store',
+                        type=float,
+                        help="Maximum length of the video in seconds.  Only "
+                             "the highest rated clips of all users that fit "
+                             "are downloaded.  Default is every 'good' clip.")
+    parser.add_argument('-N', '--max_clips',
+                        action='store',
+                        type=int,
+                        help="Maximum number of clips in the video.  Only "
+                             "the highest rated clips of all users are "
+                             "downloaded.  Default is every 'good' clip.")
+    parser.add_argument('-w', '--download_workers',
+                        action='store',
+                        type=int,
+                        default=4,
+                        help="Maximum number of clips to download at once.")
+    parser.add_argument('-C', '--cache_size',
+                        action='store',
+                        type=int,
+                        help="Disk budget in MB of the clips kept in "
+                             "clips_dir for later runs.  The least recently "
+                             "used clips are deleted when it's exceeded.  "
+                             "Default is no budget.")
+    parser.add_argument('-p', '--pipeline',
+                        action='store_true',
+                        help="Download clips as soon as they're rated "
+                             "instead of after all clips are rated.  Source "
+                             "URLs are looked up in batches of "
+                             "download_workers clips, so a batch waits for "
+                             "that many clips to be rated.  Ignored with "
+                             "max_duration or max_clips, which need every "
+                             "clip rated first.")
+    parser.add_argument('-r', '--reencode',
+                        action='store_true',
+                        help="Always decode and re-encode the clips, even "
+                             "when they could be joined by stream copy.")
+    parser.add_argument('-Q', '--encoding_profile',
+                        action='store',
+                        choices=sorted(PROFILES),
+                        default=DEFAULT_PROFILE,
+                        help="Encoding profile to re-encode clips with.  "
+                             "'fast' uses every core and encodes avi with "
+                             "ffv1 instead of png, 'small' makes smaller "
+                             "files more slowly, and 'lossless' keeps every "
+                             "pixel of avi (ffv1), but mp4 still loses "
+                             "chroma to yuv420p.  See encoding.py for "
+                             "benchmarks.")
+    parser.add_argument('-R', '--render_window',
+                        action='store',
+                        type=int,
+                        help="Maximum number of clips to have open while "
+                             "re-encoding.  Bounds memory and open files for "
+                             "large compilations.  Default is all clips.")
+    parser.add_argument('-P', '--render_workers',
+                        action='store',
+                        type=int,
+                        help="Number of processes to re-encode clips with, "
+                             "one clip per process.  Default is to "
+                             "re-encode in the main process.")
     parser.add_argument('-l', '--lang',
                         action='store',
                         nargs='+',
                         help=("Languages of clips to get, e.g. 'en' for English"
                               ", 'ko' for Korean, 'es' for Spanish."))
+    parser.add_argument('-t', '--token_cache',
+                        action='store',
+                        help="File to keep the Twitch app access token in "
+                             "between runs.  The token is reused until it's "
+                             "about to expire.  Implies --keep_token.")
+    parser.add_argument('-k', '--keep_token',
+                        action='store_true',
+                        help="Don't revoke the Twitch app access token at the "
+                             "end of the run.")
+    parser.add_argument('-V', '--view_cache',
+                        action='store',
+                        help="SQLite file to keep the view counts of videos "
+                             "in between runs.")
+    parser.add_argument('-T', '--view_cache_ttl',
+                        action='store',
+                        type=int,
+                        default=DEFAULT_TTL,
+                        help="Seconds before a cached view count of a recent "
+                             "video, or an indexed recent clip, is "
+                             "refreshed.")
+    parser.add_argument('-I', '--clip_index',
+                        action='store',
+                        help="SQLite file to keep fetched clips and their "
+                             "ratings in between runs.  When started_at is "
+                             "given, only clips newer than the ones already "
+                             "in it are fetched.  Recent clips are fetched "
+                             "again after view_cache_ttl.")
+    parser.add_argument('-M', '--metrics_file',
+                        action='store',
+                        help="JSON file to write the time spent in each "
+                             "stage, HTTP request counts and latencies, and "
+                             "other counters of the run into.")
+    parser.add_argument('-E', '--prometheus_file',
+                        action='store',
+                        help="File to write the metrics of the run into in "
+                             "the Prometheus text format, e.g. for the "
+                             "node_exporter textfile collector.  Should end "
+                             "in .prom.")
+    parser.add_argument('-n', '--dry_run',
+                        action='store_true',
+                        help="Only print the clips that would be spliced "
+                             "and their ratings.  Nothing is downloaded or "
+                             "written to output_file.")
     parser.add_argument('-L', '--log_file',
                         action='store',
                         help="Name of the log file.")
@@ -94,6 +215,33 @@ def _parse_credentials_cfg(config):
     logging.info("Loaded TWITCH_CLIENT_SECRET")
     return credentials
 
+def _print_clips(clips_list):
+    """Prints the rating, length, broadcaster and ID of each clip, and
+    their total length.
+    """
+    total_duration = 0.0
+    num_clips = 0
+    for clip in clips_list:
+        duration = clip.get('duration') or 0.0
+        print(f"{clip['rating']:8.3f} {duration:6.1f}s "
+              f"{clip['broadcaster_name']} {clip['id']}")
+        total_duration += duration
+        num_clips += 1
+    print(f"{num_clips} clip(s), {total_duration:.1f}s")
+
+def _write_metrics(metrics, args):
+    """Logs the time spent in each stage and writes the metrics files."""
+    for stage, totals in metrics.stages.items():
+        logging.info("Stage %s: %.3f seconds in %s span(s)", stage,
+                     totals['seconds'], totals['count'])
+    try:
+        if args.metrics_file is not None:
+            metrics.write_json(args.metrics_file)
+        if args.prometheus_file is not None:
+            metrics.write_prometheus(args.prometheus_file)
+    except OSError:
+        logging.exception("Couldn't write the metrics")
+
 def main():
     """Executes the Clip9 main script."""
     start_time = time.time()
@@ -113,28 +261,91 @@ def main():
     client_id = credentials['TWITCH_CLIENT_ID']
     client_secret = credentials['TWITCH_CLIENT_SECRET']
 
-    token = OauthToken(client_id, client_secret)
-    if not token.validate():
-        logging.error("Token for %s isn't valid", client_id)
-        sys.exit(1)
+    metrics = Metrics()
+    rate_limiter = RateLimiter()
+    session = create_session(pool_maxsize=max(args.fetch_workers,
+                                              args.download_workers),
+                             rate_limiter=rate_limiter, metrics=metrics)
+    with metrics.span('token'):
+        token = OauthToken(client_id, client_secret, session=session,
+                           cache_file=args.token_cache)
+        if not token.validate():
+            logging.warning("Token for %s isn't valid, getting a new one",
+                            client_id)
+            token.refresh()
+            if not token.validate():
+                logging.error("Token for %s isn't valid", client_id)
+                sys.exit(1)
 
+    clips_list = None
     try:
         team_users = TeamUsers()
-        team_users.get(args.team, client_id=client_id, oauth_token=token.token)
+        with metrics.span('team'):
+            team_users.get(args.team, client_id=client_id,
+                           oauth_token=token.token)
         users_list = team_users.users_list
+        view_cache = None
+        if args.view_cache is not None:
+            view_cache = ViewCountCache(args.view_cache,
+                                        ttl=args.view_cache_ttl)
+        clip_index = None
+        if args.clip_index is not None:
+            clip_index = ClipIndex(args.clip_index, ttl=args.view_cache_ttl)
         getter = ClipGetter(users_list, started_at=args.started_at,
-                            ended_at=args.ended_at, lang=args.lang)
-        clips_list = getter.get_clips(client_id, token.token)
-        splicer = ClipSplicer(clips_list)
+                            ended_at=args.ended_at, lang=args.lang,
+                            max_workers=args.fetch_workers,
+                            max_clips=args.max_user_clips, session=session,
+                            view_cache=view_cache, clip_index=clip_index,
+                            metrics=metrics)
+        if args.max_duration is not None or args.max_clips is not None:
+            if args.pipeline and not args.dry_run:
+                logging.warning("Clips can't be downloaded before every clip "
+                                "is rated with max_duration or max_clips, so "
+                                "they're downloaded after")
+            clips_list, num_clips = select_clips(
+                getter.iter_clips(client_id, token.token),
+                max_duration=args.max_duration, max_clips=args.max_clips)
+            metrics.increment('clips_selected', len(clips_list))
+            if num_clips > 0 and not clips_list:
+                logging.error("None of the %s good clips fit in "
+                              "max_duration %s and max_clips %s", num_clips,
+                              args.max_duration, args.max_clips)
+                if not args.dry_run:
+                    sys.exit(1)
+        elif args.pipeline or args.dry_run:
+            clips_list = getter.iter_clips(client_id, token.token)
+        else:
+            clips_list = getter.get_clips(client_id, token.token)
+        if args.dry_run:
+            _print_clips(clips_list)
+            return
+        cache_max_bytes = None
+        if args.cache_size is not None:
+            cache_max_bytes = args.cache_size * 1024 * 1024
+        splicer = ClipSplicer(clips_list, max_workers=args.download_workers,
+                              session=session, cache_max_bytes=cache_max_bytes,
+                              stream_copy=not args.reencode,
+                              render_window=args.render_window,
+                              render_workers=args.render_workers,
+                              encoding_profile=args.encoding_profile,
+                              metrics=metrics)
         splicer.splice(args.output_file, args.clips_dir)
         logging.info("Successfully generated a video of 'good' clips")
     except Exception as e:
         logging.error("There was an exception during execution")
         raise e
     finally:
-        token.revoke()
+        # Stops the threads of ClipGetter.iter_clips() if the clips weren't
+        # all taken, e.g. after an error or Ctrl-C in a dry run.
+        if hasattr(clips_list, 'close'):
+            clips_list.close()
+        logging.info("Helix rate limit budget: %s, waiting requests: %s",
+                     rate_limiter.budget, rate_limiter.queue_depth)
+        if not args.keep_token and args.token_cache is None:
+            token.revoke()
         elapsed_time = time.time() - start_time
         logging.info("Execution time: %s seconds", elapsed_time)
+        _write_metrics(metrics, args)
 
 if __name__ == '__main__':
     main()
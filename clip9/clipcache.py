@@ -0,0 +1,158 @@
+"""Module for the ClipCache class."""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+class ClipCache:
+    """A persistent cache of downloaded clip files, keyed by clip ID.
+
+    The cache keeps an index of the size and last use time of each clip
+    file it downloaded.  A clip is only a hit if its file still has the
+    size it was downloaded with.  Files in the directory that aren't in
+    the index are never used or deleted.
+    """
+
+    INDEX_FILE_NAME = '.clip9_cache.json'
+
+    def __init__(self, cache_dir, max_bytes=None):
+        """Initializes a new ClipCache
+
+        :param cache_dir: Directory the clip files are saved in.
+        :param max_bytes: Disk budget of the cache.  The least recently
+                          used clips are deleted by evict() when the
+                          budget is exceeded.  Default is no budget.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        # IDs of the clips this cache dropped, so that save() doesn't add
+        # them back from the index of another run.
+        self._removed = set()
+
+    def _index_path(self):
+        return f'{self.cache_dir}/{self.INDEX_FILE_NAME}'
+
+    def _load_index(self):
+        """Returns the index saved in cache_dir, or an empty one."""
+        try:
+            with open(self._index_path()) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logging.warning("Clip cache index %s is corrupt, ignoring it",
+                            self._index_path())
+            return {}
+        logging.info("Loaded clip cache index with %s clip(s)", len(index))
+        return index
+
+    def path(self, clip_id):
+        """Returns the path of the file of a clip."""
+        return f'{self.cache_dir}/{clip_id}.mp4'
+
+    def get(self, clip_id):
+        """Returns true if a clip is cached and its file is intact, false
+        otherwise.  Marks the clip as used on a hit.
+        """
+        with self._lock:
+            entry = self._index.get(clip_id)
+            if entry is None:
+                return False
+            try:
+                size = os.path.getsize(self.path(clip_id))
+            except OSError:
+                size = None
+            if size != entry['size']:
+                logging.warning("Cached clip %s is %s bytes but should be %s "
+                                "bytes", clip_id, size, entry['size'])
+                del self._index[clip_id]
+                self._removed.add(clip_id)
+                return False
+            entry['last_used'] = time.time()
+            logging.info("Clip %s is cached", clip_id)
+            return True
+
+    def put(self, clip_id):
+        """Adds the downloaded file of a clip to the cache."""
+        size = os.path.getsize(self.path(clip_id))
+        with self._lock:
+            self._index[clip_id] = {'size': size, 'last_used': time.time()}
+            self._removed.discard(clip_id)
+
+    def size(self):
+        """Returns the total size of the cached clips in bytes."""
+        with self._lock:
+            return sum(entry['size'] for entry in self._index.values())
+
+    def evict(self, keep=()):
+        """Deletes the least recently used clips until the cache fits in
+        max_bytes.
+
+        :param keep: IDs of clips that must not be deleted, e.g. the ones
+                     being spliced.
+        :returns: List of IDs of the deleted clips.
+        """
+        if self.max_bytes is None:
+            return []
+        evicted = []
+        with self._lock:
+            total = sum(entry['size'] for entry in self._index.values())
+            lru = sorted(self._index.items(),
+                         key=lambda item: item[1]['last_used'])
+            for clip_id, entry in lru:
+                if total <= self.max_bytes:
+                    break
+                if clip_id in keep:
+                    continue
+                try:
+                    os.remove(self.path(clip_id))
+                except FileNotFoundError:
+                    pass
+                del self._index[clip_id]
+                self._removed.add(clip_id)
+                total -= entry['size']
+                evicted.append(clip_id)
+        if evicted:
+            logging.info("Evicted %s clip(s) from the cache: %s",
+                         len(evicted), evicted)
+        return evicted
+
+    def _merge_index(self, index):
+        """Adds the entries of another run's index that this cache didn't
+        drop, keeping the latest use time of each clip.
+        """
+        for clip_id, entry in index.items():
+            if clip_id in self._removed:
+                continue
+            ours = self._index.get(clip_id)
+            if ours is None:
+                self._index[clip_id] = entry
+            elif entry['size'] == ours['size']:
+                ours['last_used'] = max(ours['last_used'],
+                                        entry['last_used'])
+
+    def save(self):
+        """Saves the index of the cache into cache_dir.
+
+        Runs sharing cache_dir may save at the same time, so the index on
+        disk is merged in first and written through a unique temporary
+        file.
+        """
+        with self._lock:
+            self._merge_index(self._load_index())
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.abspath(self.cache_dir),
+                prefix=f'{self.INDEX_FILE_NAME}.')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(self._index, f)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, self._index_path())
+            except BaseException:
+                os.remove(tmp_path)
+                raise
@@ -1,17 +1,36 @@
 """Module for the ClipGetter class."""
 
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import math
+import queue
+import threading
+import time
 
-import requests
-from twitch import TwitchHelix
-from twitch.resources import Clip
+import numpy as np
+
+from cliprecord import ClipRecord
+from cliptable import ClipTable
+from constants import (BASE_HELIX_URL, HELIX_MAX_CLIP_IDS,
+                       HELIX_MAX_PAGE_SIZE, HELIX_MAX_VIDEO_IDS)
+from httpsession import create_session
+from metrics import Metrics
+from timestamps import format_timestamp, parse_timestamp
+
+DEFAULT_QUEUE_SIZE = 100  # Max number of rated clips buffered per user
+DEFAULT_TIME_WINDOW = 7 * 24 * 3600  # Seconds after started_at that Helix
+                                    # gets clips until by default
+WATERMARK_LAG = 300  # Seconds before now that clips are marked as indexed
+_DONE = object()  # Marks the end of the clips of a user in a queue
 
 class ClipGetter:
     """Gets 'good' clips for streamers in a Twitch team since a certain
     time until now.
     """
 
-    def __init__(self, users_list, started_at=None, ended_at=None, lang=None):
+    def __init__(self, users_list, started_at=None, ended_at=None, lang=None,
+                 max_workers=1, max_clips=None, session=None,
+                 view_cache=None, clip_index=None, metrics=None):
         """Initializes a new ClipGetter
 
         :param users_list: List of dictionaries of information of users.
@@ -20,98 +39,412 @@ class ClipGetter:
         :param ended_at: End of time window of clips to get in RFC 3339
                          format.
         :param lang: Language of clips to get.  Default is all languages.
+        :param max_workers: Maximum number of users to get clips for at
+                            once.
+        :param max_clips: Maximum number of clips to get for each user.
+                          Default is all clips in the time window.
+        :param session: requests.Session to send requests with.  A new one
+                        is created if not given.
+        :param view_cache: ViewCountCache to look up video view counts in
+                           before asking Helix.
+        :param clip_index: ClipIndex of clips fetched by earlier runs.  When
+                           started_at is set, only the clips created after
+                           the last indexed ones are fetched from Helix.
+        :param metrics: Metrics to time the fetch and rate stages in.
         """
         self.users_list = users_list
         self.started_at = started_at
         self.ended_at = ended_at
         self.lang = lang
-        self.client = None
+        self.max_workers = max_workers
+        self.max_clips = max_clips
+        self.session = session if session is not None else create_session(
+            pool_maxsize=max_workers)
+        self.view_cache = view_cache
+        self.clip_index = clip_index
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.helix_headers = {}
+        # Video IDs to view counts looked up in this run, or None if the
+        # video couldn't be found, shared by every page of every user
+        self._video_views = {}
+        self._video_views_lock = threading.Lock()
 
-    def _get_clips(self, user_id, user_name, client_id=None, oauth_token=None):
-        """Returns a list of clips for a user."""
-        logging.info("Getting clips for %s", user_name)
-        clip_headers = {}
+    def _get_helix_headers(self, client_id=None, oauth_token=None):
+        """Returns the headers to authenticate with the Twitch Helix API."""
+        headers = {}
         if client_id is not None:
-            clip_headers['Client-ID'] = client_id
+            headers['Client-ID'] = client_id
         if oauth_token is not None:
-            clip_headers['Authorization'] = f'Bearer {oauth_token}'
+            headers['Authorization'] = f'Bearer {oauth_token}'
+        return headers
+
+    def _iter_clip_pages(self, user_id, user_name, client_id=None,
+                         oauth_token=None, started_at=None, ended_at=None):
+        """Yields lists of clips for a user, one page of up to
+        HELIX_MAX_PAGE_SIZE clips at a time.  Stops after max_clips clips
+        if max_clips is set.
+
+        :param started_at: Beginning of the time window in RFC 3339
+                           format.  Default is self.started_at.
+        :param ended_at: End of the time window in RFC 3339 format.
+                         Default is self.ended_at.
+        """
+        logging.info("Getting clips for %s", user_name)
+        clip_headers = self._get_helix_headers(client_id, oauth_token)
         clip_params = {
             'broadcaster_id': user_id,
-            'started_at': self.started_at,
-            'ended_at': self.ended_at,
-            'first': 100,
+            'started_at': started_at or self.started_at,
+            'ended_at': ended_at or self.ended_at,
         }
-        resp = requests.get(f'https://api.twitch.tv/helix/clips',
-                            headers=clip_headers, params=clip_params)
-        resp_json = resp.json()
+        num_clips = 0
+        seen = set()
+        while self.max_clips is None or num_clips < self.max_clips:
+            page_size = HELIX_MAX_PAGE_SIZE
+            if self.max_clips is not None:
+                page_size = min(page_size, self.max_clips - num_clips)
+            clip_params['first'] = page_size
+            with self.metrics.span('fetch'):
+                resp = self.session.get(f'{BASE_HELIX_URL}/clips',
+                                        headers=clip_headers,
+                                        params=clip_params)
+            resp_json = resp.json()
+
+            if resp.status_code >= 400:
+                logging.error("Error when getting clips of streamer %s: %s",
+                              user_name, resp_json['message'])
+                resp.raise_for_status()
 
-        if resp.status_code >= 400:
-            logging.error("Error when getting clips of streamer %s: %s",
-                          user_name, resp_json['message'])
-            resp.raise_for_status()
+            clips = []
+            for clip_json in resp_json['data']:
+                # Helix can repeat a clip on the next page when view
+                # counts change while paging.
+                if clip_json['id'] in seen:
+                    logging.debug("Skipping repeated clip %s",
+                                  clip_json['id'])
+                    continue
+                seen.add(clip_json['id'])
+                clip = ClipRecord.from_dict(clip_json)
+                logging.debug("Adding clip %s", clip['id'])
+                clips.append(clip)
+            logging.info("Got a page of %s clip(s) from streamer %s",
+                         len(clips), user_name)
+            if clips:
+                num_clips += len(clips)
+                self.metrics.increment('clips_fetched', len(clips))
+                yield clips
 
-        clips_json = resp_json['data']
+            # Helix can return a short page before the last one, so only
+            # a missing cursor or an empty page ends the paging.
+            cursor = resp_json.get('pagination', {}).get('cursor')
+            if not resp_json['data'] or cursor is None:
+                break
+            clip_params['after'] = cursor
+
+    def _get_clips(self, user_id, user_name, client_id=None, oauth_token=None):
+        """Returns a list of clips for a user."""
         clips = []
-        for clip_json in clips_json:
-            clip = Clip.construct_from(clip_json)
-            logging.debug("Adding clip %s", clip['id']);
-            clips.append(clip)
+        for page in self._iter_clip_pages(user_id, user_name, client_id,
+                                          oauth_token):
+            clips.extend(page)
         logging.info("Got %s clip(s) from streamer %s", len(clips), user_name)
         return clips
 
-    def _get_clip_video_views(self, clip):
-        """Returns the view count of the video that a clip was created from."""
-        logging.info("Getting video views for clip %s", clip['id'])
-        if clip['video_id'] == '':
-            logging.info("Video couldn't be found for clip %s.  Default to "
-                         "900.", clip['id'])
-            return 900  # Default video views
-        video = self.client.get_videos(video_ids=[clip['video_id']])[0]
-        logging.info("Video %s for clip %s has %s view(s)", clip['video_id'],
-                     clip['id'], video.view_count)
-        return video.view_count
+    def _get_clips_by_id(self, clip_ids):
+        """Returns a list of clips looked up by ID, HELIX_MAX_CLIP_IDS clips
+        per request.  Clips that couldn't be found, e.g. deleted ones,
+        aren't in it.
+        """
+        logging.info("Getting %s clip(s) by ID", len(clip_ids))
+        clips = []
+        for i in range(0, len(clip_ids), HELIX_MAX_CLIP_IDS):
+            batch = clip_ids[i:i + HELIX_MAX_CLIP_IDS]
+            with self.metrics.span('fetch'):
+                resp = self.session.get(f'{BASE_HELIX_URL}/clips',
+                                        headers=self.helix_headers,
+                                        params={'id': batch})
+            resp_json = resp.json()
+
+            if resp.status_code >= 400:
+                logging.error("Error when getting clips %s: %s", batch,
+                              resp_json['message'])
+                resp.raise_for_status()
+
+            clips.extend(ClipRecord.from_dict(clip_json)
+                         for clip_json in resp_json['data'])
+        self.metrics.increment('clips_refreshed', len(clips))
+        return clips
+
+    def _get_videos_views(self, video_ids):
+        """Returns a dictionary of video IDs to view counts, looking up
+        HELIX_MAX_VIDEO_IDS videos per request.  Videos already looked up
+        in this run, or with a fresh view count in view_cache, aren't
+        looked up.  Videos that couldn't be found aren't in the dictionary.
+        """
+        logging.info("Getting views for %s video(s)", len(video_ids))
+        with self._video_views_lock:
+            known = {video_id: self._video_views[video_id]
+                     for video_id in video_ids
+                     if video_id in self._video_views}
+        video_ids = [video_id for video_id in video_ids
+                     if video_id not in known]
+        video_views = {video_id: views for video_id, views in known.items()
+                       if views is not None}
+        if self.view_cache is not None and video_ids:
+            video_views.update(self.view_cache.get_many(video_ids))
+            video_ids = [video_id for video_id in video_ids
+                         if video_id not in video_views]
+        videos = []
+        for i in range(0, len(video_ids), HELIX_MAX_VIDEO_IDS):
+            batch = video_ids[i:i + HELIX_MAX_VIDEO_IDS]
+            with self.metrics.span('vod_lookup'):
+                resp = self.session.get(f'{BASE_HELIX_URL}/videos',
+                                        headers=self.helix_headers,
+                                        params={'id': batch})
+            resp_json = resp.json()
+
+            if resp.status_code >= 400:
+                logging.error("Error when getting videos %s: %s", batch,
+                              resp_json['message'])
+                resp.raise_for_status()
+
+            videos.extend(resp_json['data'])
+        for video in videos:
+            video_views[video['id']] = video['view_count']
+        if self.view_cache is not None and videos:
+            self.view_cache.put_many(videos)
+        with self._video_views_lock:
+            self._video_views.update(video_views)
+            for video_id in video_ids:
+                self._video_views.setdefault(video_id, None)
+        logging.info("Got views for %s video(s)", len(video_views))
+        return video_views
 
     def _get_clip_rating(self, clip_views, video_views):
-        """Return a rating given the view count of a clip and a video."""
+        """Return a rating given the view count of a clip and a video, or
+        an array of ratings given arrays of view counts.
+        """
         return clip_views / (video_views/9 + 100)
 
+    def _get_max_clip_rating(self, clip_views):
+        """Return the highest rating a clip can have whatever the view
+        count of its video, or an array of them.  Ratings go down as
+        video views go up, so it's the rating with a video of 0 views.
+        """
+        return self._get_clip_rating(clip_views, 0)
+
     def _get_good_clips(self, clips):
-        """Return a subset of 'good' clips from a list of clips."""
-        logging.info("Getting good clips from %s clip(s)", len(clips))
-        good_clips = []
-        for clip in clips:
-            if (self.lang is None or clip['language'] in self.lang):
-                logging.debug("Clip %s by %s has %s views", clip['id'],
-                              clip['broadcaster_name'], clip['view_count'])
-                video_views = self._get_clip_video_views(clip)
-                clip['rating'] = self._get_clip_rating(clip['view_count'],
-                                                       video_views)
-                logging.info("Clip %s rating %s", clip['id'], clip['rating'])
-                if clip['rating'] >= 1:
-                    logging.info("Clip %s is 'good'", clip['id'])
-                    good_clips.append(clip)
-            else:
-                logging.debug("Clip %s by %s doesn't isn't lang %s", clip['id'],
-                              clip['broadcaster_name'], self.lang)
-        return good_clips
+        """Return a subset of 'good' clips from a list of clips.  Every
+        clip in lang gets a rating.
+
+        Clips whose max rating is under 1, e.g. clips with under 100
+        views, can't be 'good', so their videos aren't looked up and they
+        are rated with their max rating instead.
+        """
+        with self.metrics.span('rate'):
+            logging.info("Getting good clips from %s clip(s)", len(clips))
+            table = ClipTable(clips)
+            in_lang = table.in_lang(self.lang)
+            max_ratings = self._get_max_clip_rating(table.view_counts)
+            can_be_good = in_lang & (max_ratings >= 1)
+            video_ids = table.get_video_ids(can_be_good)
+            num_skipped = len(table.get_video_ids(in_lang)) - len(video_ids)
+            if num_skipped:
+                logging.info("Skipped looking up %s video(s) of clips that "
+                             "can't be 'good'", num_skipped)
+                self.metrics.increment('vod_lookups_skipped', num_skipped)
+            self.metrics.increment('clips_pruned',
+                                   int((in_lang & ~can_be_good).sum()))
+            if video_ids:
+                table.set_video_views(self._get_videos_views(video_ids))
+            ratings = np.where(
+                can_be_good,
+                self._get_clip_rating(table.view_counts, table.video_views),
+                max_ratings)
+            table.set_ratings(ratings, in_lang)
+            good_clips = table.select(in_lang & (ratings >= 1))
+            logging.info("%s of %s clip(s) in lang %s are 'good'",
+                         len(good_clips), int(in_lang.sum()), self.lang)
+            for clip in good_clips:
+                logging.debug("Clip %s by %s is 'good' with rating %s",
+                              clip['id'], clip['broadcaster_name'],
+                              clip['rating'])
+            self.metrics.increment('clips_good', len(good_clips))
+            return good_clips
+
+    def _put(self, clip_queue, item, stop):
+        """Puts an item on a queue, waiting for space until stop is set.
+
+        :returns: True if the item was put on the queue, false if stop was
+                  set first.
+        """
+        while not stop.is_set():
+            try:
+                clip_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get_indexed_good_clips(self, clips):
+        """Return a subset of 'good' clips from a list of clips from
+        clip_index.  Clips that were already rated keep their rating, the
+        rest are rated now.
+        """
+        in_lang = [clip for clip in clips
+                   if self.lang is None or clip['language'] in self.lang]
+        unrated = [clip for clip in in_lang if 'rating' not in clip]
+        if unrated:
+            self._get_good_clips(unrated)
+            self.clip_index.set_ratings(unrated)
+        return [clip for clip in in_lang if clip.get('rating', 0) >= 1]
+
+    def _refresh_clips(self, clips, clip_ids):
+        """Returns a list of clips from clip_index with the clips in
+        clip_ids fetched again from Helix, unrated, and saves them in
+        clip_index.  Clips that couldn't be fetched again are dropped.
+        """
+        logging.info("Refreshing the view counts of %s indexed clip(s)",
+                     len(clip_ids))
+        fresh_clips = self._get_clips_by_id(clip_ids)
+        self.clip_index.put_clips(fresh_clips)
+        fresh_clips = {clip['id']: clip for clip in fresh_clips}
+        stale_ids = set(clip_ids)
+        return [fresh_clips[clip['id']] if clip['id'] in stale_ids
+                else clip
+                for clip in clips
+                if clip['id'] not in stale_ids or clip['id'] in fresh_clips]
+
+    def _iter_user_indexed_good_clips(self, user, client_id=None,
+                                      oauth_token=None):
+        """Yields a list of 'good' clips for a user, taking the part of the
+        time window the user's clips are already indexed for from
+        clip_index, and fetching only the rest from Helix.
+
+        The indexed and fetched clips are merged by view count, like
+        Helix orders them, and newest first for the same view count, so
+        the clips come out in the same order whether or not they were
+        indexed.  They're only yielded once every page is fetched.
+        """
+        good_clips = {}
+        started_at = parse_timestamp(self.started_at)
+        if self.ended_at is not None:
+            ended_at = parse_timestamp(self.ended_at)
+        else:
+            ended_at = started_at + DEFAULT_TIME_WINDOW
+        coverage = self.clip_index.get_coverage(user['_id'])
+        covered_from, fetch_from = started_at, started_at
+        if coverage is not None and coverage[0] <= started_at <= coverage[1]:
+            # Helix only takes whole seconds, so the indexed part of the
+            # window ends on a whole second where the fetched part starts.
+            covered_from, fetch_from = coverage[0], math.floor(coverage[1])
+            clips = self.clip_index.get_clips(user['_id'], started_at,
+                                              min(ended_at, fetch_from))
+            stale_ids = self.clip_index.get_stale_clip_ids(
+                user['_id'], started_at, min(ended_at, fetch_from))
+            if stale_ids:
+                clips = self._refresh_clips(clips, stale_ids)
+            for clip in self._get_indexed_good_clips(clips):
+                good_clips[clip['id']] = clip
+
+        if fetch_from < ended_at:
+            logging.info("Fetching clips of %s from %s", user['name'],
+                         format_timestamp(fetch_from))
+            for clips in self._iter_clip_pages(
+                    user['_id'], user['name'], client_id, oauth_token,
+                    format_timestamp(fetch_from), format_timestamp(ended_at)):
+                for clip in self._get_good_clips(clips):
+                    good_clips[clip['id']] = clip
+                self.clip_index.put_clips(clips)
+
+        # Clips show up in Helix a little after they're created, so the
+        # most recent part of the window isn't marked as covered.
+        covered_to = math.floor(min(ended_at, time.time() - WATERMARK_LAG))
+        if self.max_clips is None and covered_to > fetch_from:
+            self.clip_index.set_coverage(user['_id'], covered_from,
+                                         covered_to)
+        yield sorted(good_clips.values(),
+                     key=lambda clip: (clip['view_count'],
+                                       parse_timestamp(clip['created_at'])),
+                     reverse=True)
+
+    def _iter_user_good_clips(self, user, client_id=None, oauth_token=None):
+        """Yields lists of 'good' clips for a user as soon as each page of
+        clips is rated.
+        """
+        if self.clip_index is not None and self.started_at is not None:
+            yield from self._iter_user_indexed_good_clips(user, client_id,
+                                                          oauth_token)
+            return
+        for clips in self._iter_clip_pages(user['_id'], user['name'],
+                                           client_id, oauth_token):
+            yield self._get_good_clips(clips)
+
+    def _queue_user_good_clips(self, user, client_id, oauth_token,
+                               clip_queue, stop):
+        """Puts the 'good' clips of a user on a queue as soon as each page
+        of clips is rated, followed by _DONE.  Puts the exception instead
+        if one is raised.
+        """
+        try:
+            if stop.is_set():
+                return
+            num_good_clips = 0
+            for good_clips in self._iter_user_good_clips(user, client_id,
+                                                         oauth_token):
+                for clip in good_clips:
+                    if not self._put(clip_queue, clip, stop):
+                        return
+                    num_good_clips += 1
+                if stop.is_set():
+                    return  # Before the next page is fetched
+            logging.info("Found %s good clip(s) for %s", num_good_clips,
+                         user['name'])
+            self._put(clip_queue, _DONE, stop)
+        except Exception as e:
+            self._put(clip_queue, e, stop)
+
+    def iter_clips(self, client_id=None, oauth_token=None,
+                   queue_size=DEFAULT_QUEUE_SIZE):
+        """Yields information of 'good' clips from a list of users as soon
+        as they're rated, in the same order as get_clips().
+
+        Up to max_workers users are fetched and rated at once.  Each user
+        has a queue of up to queue_size rated clips, so fetching only runs
+        ahead of the consumer by a bounded amount.  A queue_size of 0 means
+        the queues aren't bounded.
+        """
+        logging.info("Getting clips")
+        self.helix_headers = self._get_helix_headers(client_id, oauth_token)
+        stop = threading.Event()
+        clip_queues = [queue.Queue(maxsize=queue_size)
+                       for _ in self.users_list]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                for user, clip_queue in zip(self.users_list, clip_queues):
+                    executor.submit(self._queue_user_good_clips, user,
+                                    client_id, oauth_token, clip_queue, stop)
+                for clip_queue in clip_queues:
+                    item = clip_queue.get()
+                    while item is not _DONE:
+                        if isinstance(item, Exception):
+                            raise item
+                        yield item
+                        item = clip_queue.get()
+            finally:
+                stop.set()
 
     def get_clips(self, client_id=None, oauth_token=None):
         """Return a list of information of 'good' clips from a list of
         users.
 
-        The format of the information of each clip can be found here:
+        Each clip is a ClipRecord holding only the fields in its
+        __slots__, with the names of the Helix Get Clips fields:
         https://dev.twitch.tv/docs/api/reference/#get-clips
+        ClipRecord.to_dict() turns one into a dictionary.
         """
-        logging.info("Getting clips")
-        self.client = TwitchHelix(client_id=client_id, oauth_token=oauth_token)
-        total_clips = []
-        for user in self.users_list:
-            clips = self._get_clips(user['_id'], user['name'],
-                                    client_id, oauth_token)
-            good_clips = self._get_good_clips(clips)
-            logging.info("Found %s good clip(s) for %s", len(good_clips),
-                         user['name'])
-            if good_clips:
-                total_clips.extend(good_clips)
+        # Every clip is collected anyway, so a worker never has to wait for
+        # the users before its own to be taken off their queues.
+        total_clips = list(self.iter_clips(client_id, oauth_token,
+                                           queue_size=0))
         logging.info("Got %s clips", len(total_clips))
         return total_clips
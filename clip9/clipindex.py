@@ -0,0 +1,153 @@
+"""Module for the ClipIndex class."""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from cliprecord import ClipRecord
+from timestamps import parse_timestamp
+from viewcache import DEFAULT_SETTLED_AGE, DEFAULT_TTL
+
+class ClipIndex:
+    """An on-disk SQLite index of clips that were already fetched and
+    rated, with the time window each broadcaster's clips were fetched for.
+
+    The window is a high-water mark: every clip of the broadcaster created
+    between covered_from and covered_to is in the index, so only the part
+    of a new time window after covered_to has to be fetched from Helix.
+
+    The view count of a clip keeps going up for a while after it's
+    created, so a clip fetched before it was settled_age old is stale once
+    it was fetched more than ttl ago, and should be fetched again.
+    """
+
+    def __init__(self, db_file, ttl=DEFAULT_TTL,
+                 settled_age=DEFAULT_SETTLED_AGE):
+        """Initializes a new ClipIndex
+
+        :param db_file: Path of the SQLite database file.
+        :param ttl: Seconds before the view count of a recent clip is
+                    stale.
+        :param settled_age: Age in seconds of a clip at which its view
+                            count is never stale.
+        """
+        self.ttl = ttl
+        self.settled_age = settled_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS clips ('
+                'clip_id TEXT PRIMARY KEY, '
+                'broadcaster_id TEXT NOT NULL, '
+                'created_at REAL NOT NULL, '
+                'rating REAL, '
+                'clip_json TEXT NOT NULL, '
+                'fetched_at REAL)')
+            columns = [row[1] for row in
+                       self._conn.execute('PRAGMA table_info(clips)')]
+            if 'fetched_at' not in columns:
+                # Indexes from before fetched_at have every clip stale
+                self._conn.execute(
+                    'ALTER TABLE clips ADD COLUMN fetched_at REAL')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS clips_broadcaster_created_at '
+                'ON clips (broadcaster_id, created_at)')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS watermarks ('
+                'broadcaster_id TEXT PRIMARY KEY, '
+                'covered_from REAL NOT NULL, '
+                'covered_to REAL NOT NULL)')
+
+    def get_coverage(self, broadcaster_id):
+        """Returns a tuple of the Unix times the clips of a broadcaster are
+        indexed from and to, or None if none are.
+        """
+        with self._lock:
+            return self._conn.execute(
+                'SELECT covered_from, covered_to FROM watermarks '
+                'WHERE broadcaster_id = ?', (str(broadcaster_id),)).fetchone()
+
+    def set_coverage(self, broadcaster_id, covered_from, covered_to):
+        """Sets the Unix times the clips of a broadcaster are indexed from
+        and to.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO watermarks '
+                '(broadcaster_id, covered_from, covered_to) VALUES (?, ?, ?)',
+                (str(broadcaster_id), covered_from, covered_to))
+
+    def get_clips(self, broadcaster_id, started_at, ended_at):
+        """Returns a list of ClipRecords of the indexed clips of a
+        broadcaster created in a time window.  Clips that were rated have a
+        'rating' key.
+
+        :param started_at: Unix time of the beginning of the time window.
+        :param ended_at: Unix time of the end of the time window.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT clip_json, rating FROM clips '
+                'WHERE broadcaster_id = ? AND created_at >= ? '
+                'AND created_at < ?',
+                (str(broadcaster_id), started_at, ended_at)).fetchall()
+        clips = []
+        for clip_json, rating in rows:
+            clip = ClipRecord.from_dict(json.loads(clip_json))
+            clip['rating'] = rating
+            clips.append(clip)
+        logging.info("Found %s indexed clip(s) of broadcaster %s",
+                     len(clips), broadcaster_id)
+        return clips
+
+    def get_stale_clip_ids(self, broadcaster_id, started_at, ended_at):
+        """Returns a list of the IDs of the indexed clips of a broadcaster
+        created in a time window whose view counts are stale.
+
+        :param started_at: Unix time of the beginning of the time window.
+        :param ended_at: Unix time of the end of the time window.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT clip_id FROM clips '
+                'WHERE broadcaster_id = ? AND created_at >= ? '
+                'AND created_at < ? AND (fetched_at IS NULL OR '
+                '(fetched_at <= ? AND fetched_at - created_at < ?))',
+                (str(broadcaster_id), started_at, ended_at,
+                 time.time() - self.ttl, self.settled_age)).fetchall()
+        return [clip_id for clip_id, in rows]
+
+    def put_clips(self, clips):
+        """Saves clips that were just fetched and their ratings, if they
+        were rated.  Only the fields of a ClipRecord are kept.
+        """
+        now = time.time()
+        rows = []
+        for clip in clips:
+            clip_json = ClipRecord.from_dict(clip).to_dict()
+            clip_json.pop('rating', None)
+            rows.append((clip['id'], str(clip['broadcaster_id']),
+                         parse_timestamp(clip['created_at']),
+                         clip.get('rating'), json.dumps(clip_json), now))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO clips '
+                '(clip_id, broadcaster_id, created_at, rating, clip_json, '
+                'fetched_at) VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def set_ratings(self, clips):
+        """Saves the ratings of indexed clips, leaving the rest of them as
+        they were fetched.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'UPDATE clips SET rating = ? WHERE clip_id = ?',
+                [(clip.get('rating'), clip['id']) for clip in clips])
+
+    def close(self):
+        """Closes the database."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,105 @@
+"""Module for the ClipRecord class."""
+
+import sys
+
+def _intern(value):
+    """Returns the interned copy of a string, or value if it isn't one."""
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+class ClipRecord:
+    """The fields of a Twitch clip that clip9 uses, kept in __slots__.
+
+    A record takes a fraction of the memory of the dictionary of a whole
+    Helix clip, which matters when hundreds of thousands of clips are held
+    at once.  Its fields can be read and set like the keys of a dictionary,
+    e.g. record['view_count'], so it can be used where a Helix clip
+    dictionary is.  rating is None, and not a key, until the clip is rated.
+    """
+
+    __slots__ = ('id', 'broadcaster_id', 'broadcaster_name', 'language',
+                 'view_count', 'video_id', 'duration', 'created_at', 'rating')
+
+    def __init__(self, id, broadcaster_id=None, broadcaster_name=None,
+                 language=None, view_count=0, video_id='', duration=None,
+                 created_at=None, rating=None):
+        """Initializes a new ClipRecord
+
+        :param id: ID of the clip.
+        :param broadcaster_id: User ID of the broadcaster of the clip.
+        :param broadcaster_name: Display name of the broadcaster.
+        :param language: Language of the clip, e.g. en.
+        :param view_count: Number of times the clip was viewed.
+        :param video_id: ID of the video the clip was created from, or ''
+                         if it has none.
+        :param duration: Length of the clip in seconds.
+        :param created_at: Time the clip was created in RFC 3339 format.
+        :param rating: Rating of the clip, or None if it isn't rated.
+        """
+        self.id = id
+        self.broadcaster_id = broadcaster_id
+        self.broadcaster_name = broadcaster_name
+        self.language = language
+        self.view_count = view_count
+        self.video_id = video_id
+        self.duration = duration
+        self.created_at = created_at
+        self.rating = rating
+
+    @classmethod
+    def from_dict(cls, clip):
+        """Returns a ClipRecord of the fields of a clip dictionary, e.g.
+        one recieved from the Twitch Helix API.  Other keys are dropped.
+        The fields that many clips share are interned, so that each value
+        is held once.
+        """
+        return cls(clip['id'],
+                   broadcaster_id=_intern(clip.get('broadcaster_id')),
+                   broadcaster_name=_intern(clip.get('broadcaster_name')),
+                   language=_intern(clip.get('language')),
+                   view_count=clip.get('view_count', 0),
+                   video_id=_intern(clip.get('video_id', '')),
+                   duration=clip.get('duration'),
+                   created_at=clip.get('created_at'),
+                   rating=clip.get('rating'))
+
+    def to_dict(self):
+        """Returns the record as a dictionary with the keys of a Helix
+        clip, and 'rating' if it's rated.
+        """
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def keys(self):
+        """Returns the names of the fields of the record that are keys."""
+        if self.rating is None:
+            return [key for key in self.__slots__ if key != 'rating']
+        return list(self.__slots__)
+
+    def get(self, key, default=None):
+        """Returns the value of a key, or default if it isn't one."""
+        if key not in self:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and (key != 'rating'
+                                          or self.rating is not None)
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __eq__(self, other):
+        if not isinstance(other, ClipRecord):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f'ClipRecord({self.to_dict()!r})'
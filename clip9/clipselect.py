@@ -0,0 +1,51 @@
+"""Module for selecting the best clips within a budget."""
+
+import heapq
+import itertools
+import logging
+
+def select_clips(clips, max_duration=None, max_clips=None):
+    """Selects the highest rated clips of an iterable of rated clips that
+    fit in a budget, in the order they came in.
+
+    The clips are taken in order of rating, and a clip that would go over
+    max_duration is skipped for the lower rated ones after it, so one long
+    clip doesn't leave the rest of the budget empty.  With only max_clips,
+    the clips are kept in a min-heap of that size, so only the selected
+    clips are held at once; with max_duration every clip is held until
+    they're all rated.  Of clips with the same rating, the earlier ones
+    come first.
+
+    :param clips: Iterable of clips with a 'rating', e.g. from
+                  ClipGetter.iter_clips().
+    :param max_duration: Maximum total length of the clips in seconds,
+                         from the Helix 'duration' of each clip.  Default
+                         is no limit.
+    :param max_clips: Maximum number of clips.  Default is no limit.
+    :returns: A tuple of the list of selected clips and the number of
+              clips there were to select from.
+    """
+    order = itertools.count()
+    # Ties rank the earlier clip higher
+    entries = ((clip['rating'], -next(order), clip) for clip in clips)
+    if max_duration is None and max_clips is not None:
+        ranked = heapq.nlargest(max_clips, entries,
+                                key=lambda entry: entry[:2])
+    else:
+        ranked = sorted(entries, key=lambda entry: entry[:2], reverse=True)
+    num_clips = next(order)
+    selected = []
+    total_duration = 0.0
+    for entry in ranked:
+        if max_clips is not None and len(selected) >= max_clips:
+            break
+        duration = entry[2].get('duration') or 0.0
+        if (max_duration is not None
+                and total_duration + duration > max_duration):
+            continue  # Doesn't fit, but a shorter clip after it might
+        total_duration += duration
+        selected.append(entry)
+    selected.sort(key=lambda entry: -entry[1])
+    logging.info("Selected %s of %s clip(s) with a total duration of %.1f "
+                 "seconds", len(selected), num_clips, total_duration)
+    return [clip for _, _, clip in selected], num_clips
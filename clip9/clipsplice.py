@@ -1,29 +1,140 @@
-"""Module for ClipSplicer class."""
+"""Module for ClipSplicer class.
 
+moviepy is imported by the functions that render clips rather than at
+module load, since importing it is slow and most runs only join clips by
+stream copy, or don't splice at all.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
 
-from moviepy.editor import concatenate_videoclips, VideoFileClip
 import requests
 
-from constants import BASE_GQL_URL
+from clipcache import ClipCache
+from constants import BASE_GQL_URL, GQL_MAX_BATCH_SIZE
+from encoding import DEFAULT_PROFILE, PROFILES, get_write_kwargs
+from ffmpegtools import concat_copy, probe
+from httpsession import create_session
+from metrics import Metrics
+
+GQL_CLIENT_ID = 'kimne78kx3ncx6brgo4mv6wki5h1ko'
+TARGET_RESOLUTION = (1080, 1920)  # (height, width) of the resulting video
+DOWNLOAD_TIMEOUT = (10, 60)  # Seconds to wait to connect to the clip CDN,
+                             # and between bytes of a clip
+STREAM_COPY_VIDEO_CODECS = {'h264'}
+STREAM_COPY_AUDIO_CODECS = {'aac', None}
+
+def _silence(duration):
+    """Returns a silent stereo AudioClip."""
+    import numpy as np
+    from moviepy.editor import AudioClip
+
+    def make_frame(t):
+        if isinstance(t, np.ndarray):
+            return np.zeros((len(t), 2))
+        return [0, 0]
+    return AudioClip(make_frame, duration=duration, fps=44100)
+
+def _count_frames(clip, fps=None):
+    """Returns the number of frames a clip is written with at a frame
+    rate, or at its own frame rate if fps isn't given.
+    """
+    return round(clip.duration * (fps or clip.fps))
+
+def _open_clip(file_name, scale=True):
+    """Returns a VideoFileClip of a clip file.
+
+    :param scale: Whether to resize the frames to TARGET_RESOLUTION.
+                  Clips already at it are opened as they are, so their
+                  frames skip the resize.
+    """
+    from moviepy.editor import VideoFileClip
+
+    if scale:
+        return VideoFileClip(file_name, target_resolution=TARGET_RESOLUTION)
+    return VideoFileClip(file_name)
+
+def _normalize_clip(file_name, result_file_name, fps,
+                    profile_name=DEFAULT_PROFILE, threads=None, scale=True):
+    """Re-encodes a clip file at the target resolution and frame rate, with
+    silent audio if it has none, so that it can be joined with others by
+    stream copy.  Runs in a worker process.
+
+    :param profile_name: Name of the encoding profile to encode with.
+    :param threads: Number of threads ffmpeg should use.  Default is the
+                    profile's.
+    :param scale: Whether the clip has to be resized to the target
+                  resolution.
+    :returns: A tuple of result_file_name and the number of frames that
+              were encoded.
+    """
+    clip_file = _open_clip(file_name, scale)
+    try:
+        if clip_file.audio is None:
+            clip_file = clip_file.set_audio(_silence(clip_file.duration))
+        clip_file.write_videofile(
+            result_file_name, fps=fps, logger=None,
+            **get_write_kwargs(result_file_name, profile_name, threads))
+        frames = _count_frames(clip_file, fps)
+    finally:
+        clip_file.close()
+    return result_file_name, frames
 
 class ClipSplicer():
     """Downloads and splices Twitch clips into a video."""
 
-    def __init__(self, clips_list):
-        self.clips_list = clips_list
+    def __init__(self, clips_list, max_workers=1, session=None,
+                 cache_max_bytes=None, stream_copy=True, render_window=None,
+                 render_workers=None, encoding_profile=DEFAULT_PROFILE,
+                 metrics=None):
+        """Initializes a new ClipSplicer
 
-    def _get_clip_src_url(self, clip_id):
-        """Gets the source URL of a clip given its embed URL.
+        :param clips_list: List of info of clips recieved from the Twitch
+                           Helix API, or an iterator of them.  Clips from
+                           an iterator are downloaded as soon as they come
+                           out of it, e.g. from ClipGetter.iter_clips().
+        :param max_workers: Maximum number of clips to download at once.
+        :param session: requests.Session to send requests with.  A new one
+                        is created if not given.
+        :param cache_max_bytes: Disk budget of the clips kept in clips_dir
+                                for later runs.  Default is no budget.
+        :param stream_copy: Whether to join the clips without re-encoding
+                            them when their codec parameters allow it.
+        :param render_window: Maximum number of clips to have open while
+                              re-encoding.  The clips are rendered into
+                              segments of up to render_window clips, which
+                              are then joined by stream copy.  Default is
+                              to open every clip at once.
+        :param render_workers: Number of processes to re-encode the clips
+                               with, one clip per process.  The results
+                               are joined by stream copy.  Default is to
+                               re-encode in this process.
+        :param encoding_profile: Name of the encoding profile in
+                                 encoding.PROFILES to re-encode with.
+        :param metrics: Metrics to time the download and encode stages in.
+        """
+        self.clips_list = clips_list
+        self.max_workers = max_workers
+        self.session = session if session is not None else create_session(
+            pool_maxsize=max_workers)
+        self.cache_max_bytes = cache_max_bytes
+        self.stream_copy = stream_copy
+        self.render_window = render_window
+        self.render_workers = render_workers
+        self.encoding_profile = encoding_profile
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._probe_cache = {}
 
-        :param clip_id: ID of the clip, e.g AwkwardHelplessSalamanderSwiftRage
-        :returns: Source URL of a clip.  This URL can be used to download the
-                  the clip.
-        :raises requests.HTTPError: When the source URL can't be found.
+    def _get_clip_src_url_operation(self, clip_id):
+        """Returns the GQL operation that looks up the source URL of a
+        clip.
         """
-        logging.info("Getting clip source URL for %s", clip_id)
-        header = {"Client-Id": "kimne78kx3ncx6brgo4mv6wki5h1ko"}
-        data = [{
+        return {
             "operationName": "VideoAccessToken_Clip",
             "variables": {"slug": clip_id},
             "extensions": {
@@ -33,51 +144,476 @@ class ClipSplicer():
                                    "738c592143b5173634b7d15")
                 }
             }
-        }]
-        resp = requests.post(BASE_GQL_URL, headers=header, json=data)
+        }
 
-        if resp.status_code >= 400:
-            logging.error("Error when getting info for clip %s", clip_id)
-            resp.raise_for_status()
+    def _parse_clip_src_url(self, clip_id, result):
+        """Returns the source URL of a clip from the result of its GQL
+        operation.
 
-        json = resp.json()
-        if 'errors' in json[0]:
+        :raises requests.HTTPError: When the source URL can't be found.
+        """
+        if 'errors' in result:
             raise requests.HTTPError(f"Errors when finding info for clip "
-                                     f"{clip_id}: {json[0]['errors']}")
+                                     f"{clip_id}: {result['errors']}")
 
-        clip_info = json[0]['data']['clip']
+        clip_info = result['data']['clip']
         if clip_info is None:
             raise requests.HTTPError(f"Couldn't find clip {clip_id}")
 
         return clip_info['videoQualities'][0]['sourceURL']
 
-    def _download_clip(self, clip, path):
+    def _get_clip_src_url(self, clip_id):
+        """Gets the source URL of a clip given its embed URL.
+
+        :param clip_id: ID of the clip, e.g AwkwardHelplessSalamanderSwiftRage
+        :returns: Source URL of a clip.  This URL can be used to download the
+                  the clip.
+        :raises requests.HTTPError: When the source URL can't be found.
+        """
+        logging.info("Getting clip source URL for %s", clip_id)
+        header = {"Client-Id": GQL_CLIENT_ID}
+        data = [self._get_clip_src_url_operation(clip_id)]
+        resp = self.session.post(BASE_GQL_URL, headers=header, json=data)
+
+        if resp.status_code >= 400:
+            logging.error("Error when getting info for clip %s", clip_id)
+            resp.raise_for_status()
+
+        return self._parse_clip_src_url(clip_id, resp.json()[0])
+
+    def _get_clip_src_urls(self, clip_ids):
+        """Gets the source URLs of many clips, batching up to
+        GQL_MAX_BATCH_SIZE lookups into each request.
+
+        :param clip_ids: List of IDs of clips.
+        :returns: A tuple of a dictionary of clip IDs to source URLs, and
+                  a dictionary of clip IDs to the requests.HTTPError
+                  raised when their source URL couldn't be found.
+        """
+        logging.info("Getting clip source URLs for %s clip(s)", len(clip_ids))
+        header = {"Client-Id": GQL_CLIENT_ID}
+        src_urls = {}
+        errors = {}
+        for i in range(0, len(clip_ids), GQL_MAX_BATCH_SIZE):
+            batch = clip_ids[i:i + GQL_MAX_BATCH_SIZE]
+            data = [self._get_clip_src_url_operation(clip_id)
+                    for clip_id in batch]
+            resp = self.session.post(BASE_GQL_URL, headers=header, json=data)
+
+            if resp.status_code >= 400:
+                logging.error("Error when getting info for clips %s", batch)
+                try:
+                    resp.raise_for_status()
+                except requests.HTTPError as e:
+                    errors.update((clip_id, e) for clip_id in batch)
+                continue
+
+            results = resp.json()
+            if not isinstance(results, list):
+                logging.error("Unexpected response for clips %s: %s", batch,
+                              results)
+                results = []
+            for clip_id, result in zip(batch, results):
+                try:
+                    src_urls[clip_id] = self._parse_clip_src_url(clip_id,
+                                                                 result)
+                except requests.HTTPError as e:
+                    errors[clip_id] = e
+            for clip_id in batch[len(results):]:
+                errors[clip_id] = requests.HTTPError(
+                    f"No result when finding info for clip {clip_id}")
+        logging.info("Got %s clip source URL(s)", len(src_urls))
+        return src_urls, errors
+
+    def _get_range_start(self, resp):
+        """Returns the first byte of a 206 response from its Content-Range,
+        or None if it doesn't have a valid one.
+        """
+        content_range = resp.headers.get('Content-Range', '')
+        unit, _, byte_range = content_range.partition(' ')
+        start = byte_range.partition('-')[0]
+        if unit != 'bytes' or not start.isdigit():
+            return None
+        return int(start)
+
+    def _get_expected_size(self, resp, offset):
+        """Returns the size the file of a download should have once it's
+        done, or None if the response doesn't say.
+        """
+        if 'Content-Encoding' in resp.headers:
+            return None
+        if resp.status_code == 206:
+            total = resp.headers.get('Content-Range', '').rpartition('/')[2]
+            return int(total) if total.isdigit() else None
+        content_length = resp.headers.get('Content-Length')
+        return int(content_length) if content_length is not None else None
+
+    def _download_clip(self, clip, path, clip_src_url=None):
         """Downloads a clip as an mp4 file.
 
+        The clip is downloaded into a .part file first, which is renamed
+        once it's complete.  A .part file left by an interrupted download
+        is resumed with a Range request.
+
         :param clip: Info of a clip recieved from the Twitch Helix API.
         :param path: Path to save the clip in.
+        :param clip_src_url: Source URL of the clip.  Looked up if not
+                             given.
         :raises requests.HTTPError: When there is an error when downloading.
         """
         logging.info("Downloading clip %s", clip['id'])
-        clip_src_url = self._get_clip_src_url(clip['id'])
-        resp = requests.get(clip_src_url, stream=True)
+        if clip_src_url is None:
+            clip_src_url = self._get_clip_src_url(clip['id'])
+        file_name = f'{path}/{clip["id"]}.mp4'
+        part_name = f'{file_name}.part'
+        offset = os.path.getsize(part_name) if os.path.exists(part_name) else 0
+        headers = {}
+        if offset > 0:
+            logging.info("Resuming clip %s from byte %s", clip['id'], offset)
+            headers['Range'] = f'bytes={offset}-'
+        try:
+            resp = self.session.get(clip_src_url, headers=headers,
+                                    stream=True, timeout=DOWNLOAD_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise requests.HTTPError(f"Couldn't connect to download clip "
+                                     f"{clip['id']}: {e}") from e
+
+        if resp.status_code == 416 and offset > 0:
+            logging.warning("Can't resume clip %s, downloading it again",
+                            clip['id'])
+            resp.close()
+            os.remove(part_name)
+            return self._download_clip(clip, path, clip_src_url)
 
         if resp.status_code >= 400:
             logging.error("Error when downloading clip: %s", resp.status_code)
             resp.raise_for_status()
 
-        with open(f'{path}/{clip["id"]}.mp4', 'wb') as f:
-            for chunk in resp.iter_content(chunk_size=1024*1024):
-                if chunk:
-                    f.write(chunk)
+        if resp.status_code == 206 and self._get_range_start(resp) != offset:
+            # Appending a range that doesn't start at offset would make a
+            # file of the right size with the wrong bytes.
+            content_range = resp.headers.get('Content-Range')
+            resp.close()
+            if offset == 0:
+                raise requests.HTTPError(f"Got range {content_range} of clip "
+                                         f"{clip['id']} instead of all of it")
+            logging.warning("Got range %s of clip %s instead of one from "
+                            "byte %s, downloading it again", content_range,
+                            clip['id'], offset)
+            os.remove(part_name)
+            return self._download_clip(clip, path, clip_src_url)
+
+        if resp.status_code != 206:
+            offset = 0
+        num_bytes = 0
+        with open(part_name, 'ab' if offset > 0 else 'wb') as f:
+            try:
+                for chunk in resp.iter_content(chunk_size=1024*1024):
+                    if chunk:
+                        f.write(chunk)
+                        num_bytes += len(chunk)
+            except (requests.exceptions.ChunkedEncodingError,
+                    requests.ConnectionError, requests.Timeout) as e:
+                raise requests.HTTPError(f"Clip {clip['id']} was truncated "
+                                         f"at {offset + num_bytes} "
+                                         f"bytes: {e}") from e
+
+        expected_size = self._get_expected_size(resp, offset)
+        if expected_size is not None and offset + num_bytes != expected_size:
+            raise requests.HTTPError(f"Clip {clip['id']} was truncated at "
+                                     f"{offset + num_bytes} of "
+                                     f"{expected_size} bytes")
+        os.replace(part_name, file_name)
+        self.metrics.increment('download_bytes', num_bytes)
         logging.info("Downloaded %s.mp4", clip['id'])
 
-    def _splice_clips(self, result_file_name, file_list):
+    def _submit_clip_list(self, executor, path, cache=None):
+        """Submits downloads of the clips in the clips_list list that
+        aren't cached, looking up their source URLs in batches first.
+
+        :returns: A tuple of a dictionary of clip IDs to download futures,
+                  a dictionary of clip IDs to the errors raised when their
+                  source URL couldn't be found, and a set of the IDs of
+                  the cached clips.
+        """
+        # ClipGetter drops repeated clips, but a clip listed more than
+        # once must still only be downloaded once, since concurrent
+        # downloads of it would write the same file.
+        distinct = {}
+        for clip in self.clips_list:
+            distinct.setdefault(clip['id'], clip)
+        distinct = list(distinct.values())
+        cached = {clip['id'] for clip in distinct
+                  if cache is not None and cache.get(clip['id'])}
+        clips = [clip for clip in distinct if clip['id'] not in cached]
+        src_urls, errors = self._get_clip_src_urls(
+            [clip['id'] for clip in clips])
+        futures = {clip['id']: executor.submit(self._download_clip, clip,
+                                               path, src_urls[clip['id']])
+                   for clip in clips if clip['id'] in src_urls}
+        return futures, errors, cached
+
+    def _submit_clip_batch(self, executor, path, clips, slots, futures,
+                           errors):
+        """Looks up the source URLs of a batch of clips in one request and
+        submits their downloads, waiting for a free slot for each.
+
+        :param futures: Dictionary of clip IDs to download futures to add
+                        the downloads to.
+        :param errors: Dictionary of clip IDs to errors to add the clips
+                       whose source URL couldn't be found to.
+        """
+        src_urls, batch_errors = self._get_clip_src_urls(
+            [clip['id'] for clip in clips])
+        errors.update(batch_errors)
+        for clip in clips:
+            if clip['id'] not in src_urls:
+                continue
+            slots.acquire()
+            future = executor.submit(self._download_clip, clip, path,
+                                     src_urls[clip['id']])
+            future.add_done_callback(lambda _: slots.release())
+            futures[clip['id']] = future
+
+    def _submit_clip_stream(self, executor, path, cache=None):
+        """Submits downloads of clips as they come out of the clips_list
+        iterator, then replaces clips_list with a list of them.
+
+        The source URLs are looked up in batches of up to max_workers
+        clips, so a batch waits for max_workers clips to be rated before
+        any of them is downloaded.  At most 2 * max_workers downloads are
+        waiting or running at once, so the iterator is only consumed as
+        fast as clips are downloaded.
+
+        :returns: A tuple of a dictionary of clip IDs to download futures,
+                  a dictionary of clip IDs to the errors raised when their
+                  source URL couldn't be found, and a set of the IDs of
+                  the cached clips.
+        """
+        clips = []
+        futures = {}
+        errors = {}
+        cached = set()
+        seen = set()
+        slots = threading.BoundedSemaphore(2 * self.max_workers)
+        batch_size = min(self.max_workers, GQL_MAX_BATCH_SIZE)
+        batch = []
+        try:
+            for clip in self.clips_list:
+                clips.append(clip)
+                if clip['id'] in seen:
+                    continue
+                seen.add(clip['id'])
+                if cache is not None and cache.get(clip['id']):
+                    cached.add(clip['id'])
+                    continue
+                batch.append(clip)
+                if len(batch) >= batch_size:
+                    self._submit_clip_batch(executor, path, batch, slots,
+                                            futures, errors)
+                    batch = []
+            if batch:
+                self._submit_clip_batch(executor, path, batch, slots,
+                                        futures, errors)
+        finally:
+            # Closing a generator like ClipGetter.iter_clips() stops the
+            # threads behind it, which would otherwise wait forever for
+            # the rest of the clips to be taken.
+            close = getattr(self.clips_list, 'close', None)
+            if close is not None:
+                close()
+        self.clips_list = clips
+        return futures, errors, cached
+
+    def _download_clips(self, path, cache=None):
+        """Downloads the clips in clips_list, up to max_workers at a time.
+
+        :param path: Path to save the clips in.
+        :param cache: ClipCache of path.  Clips in the cache aren't
+                      downloaded again.
+        :returns: List of IDs of the clips that couldn't be downloaded, in
+                  the same order as clips_list.  A clip listed more than
+                  once is downloaded and listed once.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            if isinstance(self.clips_list, list):
+                futures, errors, cached = self._submit_clip_list(
+                    executor, path, cache)
+            else:
+                futures, errors, cached = self._submit_clip_stream(
+                    executor, path, cache)
+        fail_list = []
+        done = set()
+        for clip in self.clips_list:
+            if clip['id'] in done:
+                continue
+            done.add(clip['id'])
+            if clip['id'] in errors:
+                logging.error("HTTPError when downloading %s: %s", clip['id'],
+                              errors[clip['id']])
+                fail_list.append(clip['id'])
+                continue
+            if clip['id'] in cached:
+                continue
+            try:
+                futures[clip['id']].result()
+            except requests.HTTPError:
+                logging.exception("HTTPError when downloading %s", clip['id'])
+                fail_list.append(clip['id'])
+                continue
+            self.metrics.increment('clips_downloaded')
+            if cache is not None:
+                cache.put(clip['id'])
+        self.metrics.increment('clips_failed', len(fail_list))
+        return fail_list
+
+    def _can_stream_copy(self, result_file_name, file_names):
+        """Returns true if the files can be joined into result_file_name
+        by stream copy, false otherwise.
+
+        They can be when the result is an mp4 and every file has the same
+        H.264/AAC codec parameters at the target resolution.
+        """
+        if not result_file_name.endswith('.mp4'):
+            return False
+        infos = {self._probe(file_name) for file_name in file_names}
+        if None in infos:
+            return False
+        if len(infos) != 1:
+            logging.info("Clips have different codec parameters: %s", infos)
+            return False
+        info = infos.pop()
+        compatible = (info.video_codec in STREAM_COPY_VIDEO_CODECS
+                      and info.audio_codec in STREAM_COPY_AUDIO_CODECS
+                      and (info.height, info.width) == TARGET_RESOLUTION)
+        if not compatible:
+            logging.info("Clips can't be joined by stream copy: %s", info)
+        return compatible
+
+    def _splice_clips(self, result_file_name, file_list, fps=None):
+        from moviepy.editor import concatenate_videoclips
+
         result = concatenate_videoclips(file_list)
-        if result_file_name[-4:] == '.avi':
-            result.write_videofile(f'{result_file_name}', codec='png')
-        else:
-            result.write_videofile(f'{result_file_name}')
+        result.write_videofile(f'{result_file_name}', fps=fps,
+                               **get_write_kwargs(result_file_name,
+                                                  self.encoding_profile))
+        self.metrics.increment('encode_frames', _count_frames(result, fps))
+        result.close()
+
+    def _render(self, result_file_name, file_names, fps=None,
+                fill_audio=False):
+        """Re-encodes clip files into result_file_name, opening all of them
+        at once.
+
+        :param fill_audio: Whether to give the clips without audio a
+                           silent track, so that the result always has
+                           an audio stream.
+        """
+        clip_files = [_open_clip(file_name, self._needs_scaling(file_name))
+                      for file_name in file_names]
+        try:
+            file_list = clip_files
+            if fill_audio:
+                file_list = [
+                    clip_file if clip_file.audio is not None
+                    else clip_file.set_audio(_silence(clip_file.duration))
+                    for clip_file in clip_files]
+            self._splice_clips(result_file_name, file_list, fps)
+        finally:
+            for clip_file in clip_files:
+                clip_file.close()
+
+    def _probe(self, file_name):
+        """Returns the VideoInfo of a clip file, or None if it can't be
+        probed.  Each file is only probed once.
+        """
+        if file_name not in self._probe_cache:
+            try:
+                self._probe_cache[file_name] = probe(file_name)
+            except ValueError:
+                logging.exception("Couldn't probe %s", file_name)
+                self._probe_cache[file_name] = None
+        return self._probe_cache[file_name]
+
+    def _needs_scaling(self, file_name):
+        """Returns true if a clip file has to be resized to
+        TARGET_RESOLUTION, or if its resolution can't be found, false
+        otherwise.
+        """
+        info = self._probe(file_name)
+        scale = info is None or (info.height, info.width) != TARGET_RESOLUTION
+        if scale:
+            logging.info("Resizing %s to %sx%s", file_name,
+                         TARGET_RESOLUTION[1], TARGET_RESOLUTION[0])
+            self.metrics.increment('clips_resized')
+        return scale
+
+    def _max_fps(self, file_names):
+        """Returns the highest frame rate of the clip files, or None if it
+        can't be found.
+        """
+        infos = [self._probe(file_name) for file_name in file_names]
+        if None in infos:
+            return None
+        return max(info.fps or 0 for info in infos)
+
+    def _render_normalized(self, result_file_name, file_names, clips_dir):
+        """Re-encodes each clip file into a common intermediate format in a
+        pool of render_workers processes, one clip per worker, then joins
+        the results into result_file_name by stream copy.
+        """
+        extension = os.path.splitext(result_file_name)[1]
+        fps = self._max_fps(file_names)
+        # The cores are shared between the worker processes
+        threads = None
+        if PROFILES[self.encoding_profile].all_threads:
+            threads = max(1, (os.cpu_count() or 1) // self.render_workers)
+        normalized_dir = tempfile.mkdtemp(dir=clips_dir)
+        try:
+            logging.info("Normalizing %s clips with %s processes",
+                         len(file_names), self.render_workers)
+            with ProcessPoolExecutor(
+                    max_workers=self.render_workers) as executor:
+                results = list(executor.map(
+                    _normalize_clip, file_names,
+                    [f'{normalized_dir}/{i}{extension}'
+                     for i in range(len(file_names))],
+                    [fps] * len(file_names),
+                    [self.encoding_profile] * len(file_names),
+                    [threads] * len(file_names),
+                    [self._needs_scaling(file_name)
+                     for file_name in file_names]))
+            for _, frames in results:
+                self.metrics.increment('encode_frames', frames)
+            concat_copy([name for name, _ in results], result_file_name)
+        finally:
+            shutil.rmtree(normalized_dir)
+
+    def _render_segments(self, result_file_name, file_names, clips_dir):
+        """Re-encodes clip files into segments of up to render_window clips,
+        one segment at a time, then joins the segments into
+        result_file_name by stream copy.  Only render_window clips are open
+        at once, however many clips there are.
+        """
+        extension = os.path.splitext(result_file_name)[1]
+        fps = self._max_fps(file_names)
+        segment_dir = tempfile.mkdtemp(dir=clips_dir)
+        try:
+            segment_names = []
+            for i in range(0, len(file_names), self.render_window):
+                segment_name = f'{segment_dir}/{len(segment_names)}{extension}'
+                logging.info("Rendering segment %s of clips %s to %s",
+                             segment_name, i + 1,
+                             min(i + self.render_window, len(file_names)))
+                # Every segment needs an audio stream to be joined by
+                # stream copy, even one of clips without audio.
+                self._render(segment_name,
+                             file_names[i:i + self.render_window], fps,
+                             fill_audio=True)
+                segment_names.append(segment_name)
+            concat_copy(segment_names, result_file_name)
+        finally:
+            shutil.rmtree(segment_dir)
 
     def splice(self, result_file_name, clips_dir='./'):
         """Splices the clips in clips_list into an mp4, ogv, webm, or
@@ -87,23 +623,42 @@ class ClipSplicer():
                                  e.g. ./result.mp4 or /var/tmp/final.avi
         :param clips_dir: Directory path to save the clip files in.
         """
+        cache = ClipCache(clips_dir, max_bytes=self.cache_max_bytes)
+        with self.metrics.span('download'):
+            fail_list = self._download_clips(clips_dir, cache)
         logging.info("Splicing %s clips", len(self.clips_list))
-        file_list = []
-        fail_list = []
-        for clip in self.clips_list:
-            try:
-                self._download_clip(clip, clips_dir)
-                clip_file = VideoFileClip(f'{clips_dir}/{clip["id"]}.mp4',
-                                          target_resolution=(1080, 1920))
-                file_list.append(clip_file)
-            except requests.HTTPError:
-                logging.exception("HTTPError when downloading %s", clip['id'])
-                fail_list.append(clip['id'])
+        cache.evict(keep={clip['id'] for clip in self.clips_list})
+        try:
+            cache.save()
+        except OSError:
+            logging.exception("Couldn't save the clip cache index")
         if fail_list:
             logging.warning("Some clips couldn't be downloaded: %s", fail_list)
 
-        if len(file_list) > 0:
-            logging.info("Writing %s", result_file_name)
-            self._splice_clips(result_file_name, file_list)
-        else:
+        file_names = [f'{clips_dir}/{clip["id"]}.mp4'
+                      for clip in self.clips_list
+                      if clip['id'] not in fail_list]
+        if len(file_names) == 0:
             logging.info("No clips to splice")
+            return
+
+        logging.info("Writing %s", result_file_name)
+        if (self.stream_copy
+                and self._can_stream_copy(result_file_name, file_names)):
+            try:
+                with self.metrics.span('concat'):
+                    concat_copy(file_names, result_file_name)
+                return
+            except subprocess.CalledProcessError as e:
+                logging.error("Couldn't join the clips by stream copy, "
+                              "re-encoding them instead: %s", e.stderr)
+        with self.metrics.span('encode'):
+            if self.render_workers is not None and len(file_names) > 1:
+                self._render_normalized(result_file_name, file_names,
+                                        clips_dir)
+            elif (self.render_window is not None
+                    and len(file_names) > self.render_window):
+                self._render_segments(result_file_name, file_names,
+                                      clips_dir)
+            else:
+                self._render(result_file_name, file_names)
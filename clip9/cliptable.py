@@ -0,0 +1,73 @@
+"""Module for the ClipTable class."""
+
+import numpy as np
+
+DEFAULT_VIDEO_VIEWS = 900  # Views of the video of a clip that has none, or
+                           # whose video couldn't be found
+
+class ClipTable:
+    """The fields of a list of clips that rating uses, held as NumPy
+    columns, so that filtering and rating a page of clips each take one
+    pass over arrays instead of a Python loop.
+
+    Row i of every column belongs to clips[i].
+    """
+
+    def __init__(self, clips):
+        """Initializes a new ClipTable
+
+        :param clips: List of info of clips recieved from the Twitch Helix
+                      API.
+        """
+        self.clips = clips
+        self.view_counts = np.array([clip['view_count'] for clip in clips],
+                                    dtype=np.float64)
+        self.video_ids = np.array([clip['video_id'] or '' for clip in clips],
+                                  dtype=str)
+        self.languages = np.array([clip['language'] for clip in clips],
+                                  dtype=str)
+        self.video_views = np.full(len(clips), DEFAULT_VIDEO_VIEWS,
+                                   dtype=np.float64)
+
+    def __len__(self):
+        return len(self.clips)
+
+    def in_lang(self, lang=None):
+        """Returns a mask of the clips in one of a set of languages.
+
+        :param lang: Set of languages.  Default is every language.
+        """
+        if lang is None:
+            return np.ones(len(self), dtype=bool)
+        return np.isin(self.languages, list(lang))
+
+    def get_video_ids(self, mask):
+        """Returns the IDs of the videos of the clips in a mask, each once,
+        in the order of the clips.
+        """
+        video_ids = self.video_ids[mask & (self.video_ids != '')]
+        return list(dict.fromkeys(video_ids.tolist()))
+
+    def set_video_views(self, video_views):
+        """Fills the video_views column from a dictionary of video IDs to
+        view counts.  Clips without a video, or whose video isn't in it,
+        get DEFAULT_VIDEO_VIEWS.
+        """
+        if len(self) == 0:
+            return
+        video_ids, inverse = np.unique(self.video_ids, return_inverse=True)
+        views = np.array([video_views.get(video_id, DEFAULT_VIDEO_VIEWS)
+                          for video_id in video_ids.tolist()],
+                         dtype=np.float64)
+        self.video_views = views[inverse]
+
+    def set_ratings(self, ratings, mask):
+        """Sets the rating of each clip in a mask from an array of ratings
+        of every clip.
+        """
+        for i in np.flatnonzero(mask).tolist():
+            self.clips[i]['rating'] = float(ratings[i])
+
+    def select(self, mask):
+        """Returns a list of the clips in a mask, in order."""
+        return [self.clips[i] for i in np.flatnonzero(mask).tolist()]
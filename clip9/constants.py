@@ -4,3 +4,7 @@ BASE_HELIX_URL = 'https://api.twitch.tv/helix'
 BASE_KRAKEN_URL = 'https://api.twitch.tv/kraken'
 BASE_GQL_URL = 'https://gql.twitch.tv/gql'
 BASE_OAUTH2_URL = 'https://id.twitch.tv/oauth2'
+GQL_MAX_BATCH_SIZE = 35  # Max number of operations in one GQL request
+HELIX_MAX_VIDEO_IDS = 100  # Max number of video IDs in one Get Videos call
+HELIX_MAX_CLIP_IDS = 100  # Max number of clip IDs in one Get Clips call
+HELIX_MAX_PAGE_SIZE = 100  # Max number of objects in one Helix page
@@ -0,0 +1,109 @@
+"""Contains the encoding profiles clips are re-encoded with.
+
+Each profile picks the codecs, speed preset, quality, audio settings and
+thread count that moviepy's write_videofile passes on to ffmpeg.
+
+Encode stage of re-encoding 12 seconds of 1080p30 clips on one core,
+from benchmarks/bench.py -u 1 -n 10 --reencode --encoding_profile NAME:
+
+=========  =================  ===================  ==================
+Profile    Codecs (mp4, avi)  mp4                  avi
+=========  =================  ===================  ==================
+default    libx264, png       14.8s 24fps 0.6MB    18.2s 20fps 34.1MB
+fast       libx264, ffv1      11.9s 30fps 0.5MB    15.3s 24fps 19.2MB
+small      libx264, png       14.9s 24fps 0.3MB    17.7s 20fps 34.1MB
+lossless   libx264, ffv1       9.7s 37fps 6.6MB    15.3s 23fps 19.2MB
+=========  =================  ===================  ==================
+
+Most of the time goes to decoding and resizing the clips in moviepy,
+which the profiles don't change.  The fast, small and lossless profiles
+use every core, so their encoding gets faster on bigger machines.  ffv1
+is lossless like png, but faster to encode and about half the size.
+The lossless profile is only lossless for avi.  moviepy always writes
+libx264 as yuv420p, after any ffmpeg_params, so its crf 0 mp4 keeps every
+luma pixel but loses half the chroma resolution.
+"""
+
+from collections import namedtuple
+import os
+
+EncodingProfile = namedtuple('EncodingProfile', [
+    'video_codecs', 'preset', 'crf', 'bitrate', 'audio_codecs',
+    'audio_bitrate', 'all_threads',
+])
+EncodingProfile.__doc__ = """Settings of an encoding profile.
+
+:param video_codecs: Dictionary of file extensions to video codecs.
+                     moviepy picks the codec of other extensions.
+:param preset: Speed preset of libx264, e.g. veryfast.
+:param crf: Constant rate factor of libx264 and libvpx-vp9.  Lower is
+            better quality, 0 is lossless apart from the yuv420p chroma
+            moviepy forces on libx264.
+:param bitrate: Video bitrate, e.g. 8000k.  Overrides crf.
+:param audio_codecs: Dictionary of file extensions to audio codecs.
+                     moviepy picks the codec of other extensions.
+:param audio_bitrate: Audio bitrate, e.g. 160k.
+:param all_threads: Whether ffmpeg should use every core.
+"""
+
+DEFAULT_PROFILE = 'default'
+PROFILES = {
+    # moviepy's own settings, as clip9 always used
+    'default': EncodingProfile(
+        video_codecs={'avi': 'png'}, preset='medium', crf=None, bitrate=None,
+        audio_codecs={}, audio_bitrate=None, all_threads=False),
+    'fast': EncodingProfile(
+        video_codecs={'mp4': 'libx264', 'avi': 'ffv1', 'webm': 'libvpx'},
+        preset='veryfast', crf=23, bitrate=None,
+        audio_codecs={'mp4': 'aac', 'avi': 'pcm_s16le'},
+        audio_bitrate='160k', all_threads=True),
+    'small': EncodingProfile(
+        video_codecs={'mp4': 'libx264', 'avi': 'png',
+                      'webm': 'libvpx-vp9'},
+        preset='slow', crf=28, bitrate=None, audio_codecs={'mp4': 'aac'},
+        audio_bitrate='96k', all_threads=True),
+    'lossless': EncodingProfile(
+        video_codecs={'mp4': 'libx264', 'avi': 'ffv1'}, preset='ultrafast',
+        crf=0, bitrate=None,
+        audio_codecs={'mp4': 'aac', 'avi': 'pcm_s16le'},
+        audio_bitrate='320k', all_threads=True),
+}
+CRF_CODECS = {'libx264', 'libvpx-vp9'}  # Codecs that take -crf
+_CODEC_PARAMS = {
+    'libvpx': ['-deadline', 'realtime', '-cpu-used', '8'],
+    'libvpx-vp9': ['-b:v', '0'],  # Makes -crf the only rate control
+    'ffv1': ['-level', '3'],  # Encodes slices in parallel
+}
+
+def get_write_kwargs(result_file_name, profile_name=DEFAULT_PROFILE,
+                     threads=None):
+    """Returns the keyword arguments of write_videofile for a file.
+
+    :param result_file_name: File name of the video to write.
+    :param profile_name: Name of a profile in PROFILES.
+    :param threads: Number of threads ffmpeg should use.  Default is the
+                    profile's.
+    """
+    profile = PROFILES[profile_name]
+    extension = os.path.splitext(result_file_name)[1][1:].lower()
+    kwargs = {'preset': profile.preset}
+    codec = profile.video_codecs.get(extension)
+    if codec is not None:
+        kwargs['codec'] = codec
+    ffmpeg_params = list(_CODEC_PARAMS.get(codec, []))
+    if profile.bitrate is not None:
+        kwargs['bitrate'] = profile.bitrate
+    elif profile.crf is not None and codec in CRF_CODECS:
+        ffmpeg_params.extend(['-crf', str(profile.crf)])
+    if ffmpeg_params:
+        kwargs['ffmpeg_params'] = ffmpeg_params
+    audio_codec = profile.audio_codecs.get(extension)
+    if audio_codec is not None:
+        kwargs['audio_codec'] = audio_codec
+    if profile.audio_bitrate is not None:
+        kwargs['audio_bitrate'] = profile.audio_bitrate
+    if threads is None and profile.all_threads:
+        threads = os.cpu_count()
+    if threads is not None:
+        kwargs['threads'] = threads
+    return kwargs
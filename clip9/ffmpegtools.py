@@ -0,0 +1,102 @@
+"""Module for probing and joining video files with ffmpeg directly."""
+
+from collections import namedtuple
+import logging
+import os
+import re
+import subprocess
+import tempfile
+
+VideoInfo = namedtuple('VideoInfo', [
+    'video_codec', 'video_profile', 'pix_fmt', 'width', 'height', 'fps',
+    'audio_codec', 'sample_rate', 'channels',
+])
+
+_VIDEO_STREAM_RE = re.compile(
+    r'Stream #\d+:\d+.*?: Video: (?P<codec>\w+)(?: \((?P<profile>[^)]*)\))?'
+    r'.*?, (?P<pix_fmt>\w+)(?:\([^)]*\))?, (?P<width>\d+)x(?P<height>\d+)'
+    r'(?:.*?, (?P<fps>[\d.]+k?) fps)?')
+_AUDIO_STREAM_RE = re.compile(
+    r'Stream #\d+:\d+.*?: Audio: (?P<codec>\w+).*?, (?P<sample_rate>\d+) Hz, '
+    r'(?P<channels>[^,]+)')
+
+def _ffmpeg_binary():
+    """Returns the path of the ffmpeg binary moviepy uses.  moviepy is
+    imported here rather than at module load, since importing it is slow.
+    """
+    from moviepy.config import get_setting
+
+    return get_setting('FFMPEG_BINARY')
+
+def _parse_probe_output(output):
+    """Returns the VideoInfo of a file given the output of ffmpeg -i.
+
+    :raises ValueError: When the output doesn't have a video stream.
+    """
+    video_match = _VIDEO_STREAM_RE.search(output)
+    if video_match is None:
+        raise ValueError("No video stream found")
+    fps = video_match.group('fps')
+    if fps is not None:
+        fps = (float(fps[:-1]) * 1000 if fps.endswith('k') else float(fps))
+    audio_match = _AUDIO_STREAM_RE.search(output)
+    return VideoInfo(
+        video_codec=video_match.group('codec'),
+        video_profile=video_match.group('profile'),
+        pix_fmt=video_match.group('pix_fmt'),
+        width=int(video_match.group('width')),
+        height=int(video_match.group('height')),
+        fps=fps,
+        audio_codec=audio_match.group('codec') if audio_match else None,
+        sample_rate=(int(audio_match.group('sample_rate'))
+                     if audio_match else None),
+        channels=audio_match.group('channels') if audio_match else None,
+    )
+
+def probe(file_name):
+    """Returns the VideoInfo of the first video and audio streams of a
+    file.
+
+    :raises ValueError: When the file doesn't have a video stream.
+    """
+    logging.debug("Probing %s", file_name)
+    proc = subprocess.run([_ffmpeg_binary(), '-hide_banner',
+                           '-i', file_name],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    try:
+        info = _parse_probe_output(proc.stderr)
+    except ValueError:
+        raise ValueError(f"No video stream found in {file_name}")
+    logging.debug("%s: %s", file_name, info)
+    return info
+
+def _concat_list_entry(file_name):
+    """Returns the line of an ffmpeg concat list that refers to a file."""
+    escaped = os.path.abspath(file_name).replace("'", "'\\''")
+    return f"file '{escaped}'\n"
+
+def concat_copy(file_names, result_file_name):
+    """Joins video files into one file without re-encoding them.  The
+    files must have the same codec parameters.
+
+    :param file_names: List of paths of the files to join, in order.
+    :param result_file_name: Path of the resulting file.
+    :raises subprocess.CalledProcessError: When ffmpeg fails.
+    """
+    logging.info("Joining %s file(s) into %s by stream copy",
+                 len(file_names), result_file_name)
+    with tempfile.NamedTemporaryFile('w', suffix='.txt',
+                                     delete=False) as list_file:
+        list_file.writelines(_concat_list_entry(file_name)
+                             for file_name in file_names)
+    args = [_ffmpeg_binary(), '-hide_banner', '-loglevel',
+            'error', '-y', '-f', 'concat', '-safe', '0', '-i', list_file.name,
+            '-c', 'copy']
+    if result_file_name.endswith('.mp4'):
+        args += ['-movflags', '+faststart']
+    try:
+        subprocess.run(args + [result_file_name], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    finally:
+        os.remove(list_file.name)
@@ -0,0 +1,65 @@
+"""Module for creating the HTTP session shared by clip9's classes.
+
+A single session keeps connections to api.twitch.tv, gql.twitch.tv,
+id.twitch.tv and the clip CDN alive, so a run reuses a few warm
+connections instead of doing a TCP and TLS handshake for every call.
+"""
+
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from constants import BASE_HELIX_URL
+
+DEFAULT_POOL_CONNECTIONS = 10  # Number of hosts to keep a pool for
+DEFAULT_POOL_MAXSIZE = 10  # Number of connections to keep alive per host
+MAX_RATE_LIMIT_RETRIES = 3  # Times to retry a Helix request that got a 429
+
+class RateLimitedSession(requests.Session):
+    """A requests.Session that paces its Twitch Helix API requests with a
+    RateLimiter and retries the ones that still get a 429.
+    """
+
+    def __init__(self, rate_limiter):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+
+    def request(self, method, url, *args, **kwargs):
+        if not url.startswith(BASE_HELIX_URL):
+            return super().request(method, url, *args, **kwargs)
+        for retry in range(MAX_RATE_LIMIT_RETRIES + 1):
+            self.rate_limiter.acquire()
+            resp = super().request(method, url, *args, **kwargs)
+            self.rate_limiter.update(resp.headers)
+            if resp.status_code != 429 or retry == MAX_RATE_LIMIT_RETRIES:
+                break
+            logging.warning("Got a 429 from %s, retrying", url)
+            resp.close()  # Releases the connection back to the pool
+        return resp
+
+def create_session(pool_connections=DEFAULT_POOL_CONNECTIONS,
+                   pool_maxsize=DEFAULT_POOL_MAXSIZE, rate_limiter=None,
+                   metrics=None):
+    """Returns a requests.Session with a keep-alive connection pool for
+    each host.
+
+    :param pool_connections: Number of hosts to keep a pool for.
+    :param pool_maxsize: Number of connections to keep alive per host.
+                         Should be at least the number of threads that
+                         share the session.
+    :param rate_limiter: RateLimiter to pace Twitch Helix API requests
+                         with.  Default is no pacing.
+    :param metrics: Metrics to count every response and its latency in.
+    """
+    if rate_limiter is None:
+        session = requests.Session()
+    else:
+        session = RateLimitedSession(rate_limiter)
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if metrics is not None:
+        session.hooks['response'].append(metrics.observe_response)
+    return session
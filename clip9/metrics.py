@@ -0,0 +1,187 @@
+"""Module for the Metrics class."""
+
+from contextlib import contextmanager
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+PROMETHEUS_PREFIX = 'clip9'
+
+def _endpoint(url):
+    """Returns the endpoint to count a request to a URL under, e.g.
+    api.twitch.tv/helix/clips.  Every clip on a CDN host counts as the
+    same endpoint.
+    """
+    parts = urlsplit(url)
+    if parts.path.endswith('.mp4'):
+        return parts.netloc
+    return f'{parts.netloc}{parts.path}'
+
+def _escape_label(value):
+    """Returns a Prometheus label value with its special characters
+    escaped.
+    """
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+class Metrics:
+    """Timings and counters of a clip9 run, shared by every thread.
+
+    Stages are timed with span().  The spans of stages that run at once,
+    e.g. downloads in pipelined mode, overlap, and spans of the same stage
+    in many threads add up, so a stage can take longer than the run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.stages = {}
+        self.http = {}
+        self.counters = {}
+
+    @contextmanager
+    def span(self, stage):
+        """Times the code in a with block as a span of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(stage, time.perf_counter() - start)
+
+    def add_span(self, stage, seconds):
+        """Adds a span of a stage that took a number of seconds."""
+        with self._lock:
+            totals = self.stages.setdefault(stage, {'seconds': 0.0,
+                                                    'count': 0})
+            totals['seconds'] += seconds
+            totals['count'] += 1
+
+    def increment(self, name, value=1):
+        """Adds a value to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_request(self, url, status_code, seconds):
+        """Counts an HTTP request to a URL and how long it took."""
+        endpoint = _endpoint(url)
+        with self._lock:
+            totals = self.http.setdefault(endpoint, {
+                'requests': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                'statuses': {}})
+            totals['requests'] += 1
+            totals['seconds'] += seconds
+            totals['max_seconds'] = max(totals['max_seconds'], seconds)
+            status = str(status_code)
+            totals['statuses'][status] = totals['statuses'].get(status, 0) + 1
+
+    def observe_response(self, resp, *args, **kwargs):
+        """Counts a requests.Response.  Can be used as a response hook of
+        a requests.Session.
+        """
+        self.observe_request(resp.url, resp.status_code,
+                             resp.elapsed.total_seconds())
+
+    def encode_fps(self):
+        """Returns the frames encoded per second of the encode stage, or
+        None if nothing was encoded.
+        """
+        seconds = self.stages.get('encode', {}).get('seconds')
+        frames = self.counters.get('encode_frames')
+        if not seconds or not frames:
+            return None
+        return frames / seconds
+
+    def to_dict(self):
+        """Returns the metrics as a dictionary that can be saved as
+        JSON.
+        """
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'run_seconds': time.time() - self.started_at,
+                'stages': {stage: dict(totals)
+                           for stage, totals in self.stages.items()},
+                'http': {endpoint: dict(totals,
+                                        statuses=dict(totals['statuses']))
+                         for endpoint, totals in self.http.items()},
+                'counters': dict(self.counters),
+                'encode_fps': self.encode_fps(),
+            }
+
+    def _to_prometheus(self):
+        """Returns the metrics in the Prometheus text format."""
+        metrics = self.to_dict()
+        lines = []
+        def add(name, help_text, samples):
+            name = f'{PROMETHEUS_PREFIX}_{name}'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape_label(label)}"'
+                                      for key, label in labels.items())
+                if label_text:
+                    label_text = f'{{{label_text}}}'
+                lines.append(f'{name}{label_text} {value}')
+
+        add('last_run_timestamp_seconds', "Unix time the last run started.",
+            [({}, metrics['started_at'])])
+        add('run_seconds', "Seconds the last run took.",
+            [({}, metrics['run_seconds'])])
+        add('stage_seconds', "Seconds spent in each stage of the last run.",
+            [({'stage': stage}, totals['seconds'])
+             for stage, totals in metrics['stages'].items()])
+        add('stage_spans', "Number of spans of each stage of the last run.",
+            [({'stage': stage}, totals['count'])
+             for stage, totals in metrics['stages'].items()])
+        add('http_requests', "HTTP requests of the last run by endpoint "
+            "and status.",
+            [({'endpoint': endpoint, 'status': status}, count)
+             for endpoint, totals in metrics['http'].items()
+             for status, count in totals['statuses'].items()])
+        add('http_request_seconds', "Seconds waited for HTTP responses of "
+            "the last run by endpoint.",
+            [({'endpoint': endpoint}, totals['seconds'])
+             for endpoint, totals in metrics['http'].items()])
+        add('http_request_max_seconds', "Longest wait for an HTTP response "
+            "of the last run by endpoint.",
+            [({'endpoint': endpoint}, totals['max_seconds'])
+             for endpoint, totals in metrics['http'].items()])
+        for name, value in sorted(metrics['counters'].items()):
+            add(name, f"Value of the {name} counter of the last run.",
+                [({}, value)])
+        if metrics['encode_fps'] is not None:
+            add('encode_fps', "Frames encoded per second in the last run.",
+                [({}, metrics['encode_fps'])])
+        return '\n'.join(lines) + '\n'
+
+    def _write(self, file_name, text):
+        """Writes text into a file all at once, so that readers like the
+        node_exporter textfile collector never see a partial file.
+        """
+        fd, tmp_file = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(file_name)),
+            prefix=f'{os.path.basename(file_name)}.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            os.chmod(tmp_file, 0o644)
+            os.replace(tmp_file, file_name)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+    def write_json(self, file_name):
+        """Saves the metrics as a JSON report."""
+        logging.info("Writing metrics to %s", file_name)
+        self._write(file_name, json.dumps(self.to_dict(), indent=2) + '\n')
+
+    def write_prometheus(self, file_name):
+        """Saves the metrics as a Prometheus textfile, e.g. for the
+        node_exporter textfile collector.
+        """
+        logging.info("Writing Prometheus metrics to %s", file_name)
+        self._write(file_name, self._to_prometheus())
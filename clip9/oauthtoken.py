@@ -5,20 +5,111 @@ class. More info can be found below:
 https://dev.twitch.tv/docs/authentication/getting-tokens-oauth/#oauth-client-credentials-flow
 """
 
+import json
 import logging
-
-import requests
+import os
+import tempfile
+import time
 
 from constants import BASE_OAUTH2_URL
+from httpsession import create_session
+
+EXPIRY_MARGIN = 600  # Seconds before expiry that a cached token is replaced
+VALIDATE_INTERVAL = 3600  # Seconds between validations of a cached token
 
 class OauthToken:
     """A Twitch app access token.  Once the token instance has called
     revoke(), the instance is useless and shouldn't be used anymore.
     """
 
-    def __init__(self, client_id, client_secret):
+    def __init__(self, client_id, client_secret, session=None,
+                 cache_file=None):
+        """Initializes a new OauthToken
+
+        :param client_id: Twitch developer client ID.
+        :param client_secret: Twitch developer client secret.
+        :param session: requests.Session to send requests with.  A new one
+                        is created if not given.
+        :param cache_file: Path of a file to share the token between runs
+                           in.  The cached token is reused until shortly
+                           before it expires, and only validated with
+                           Twitch once every VALIDATE_INTERVAL seconds.
+        """
         self.client_id = client_id
-        self.token = self._get_app_access_token(client_id, client_secret)
+        self.client_secret = client_secret
+        self.session = session if session is not None else create_session()
+        self.cache_file = cache_file
+        self.expires_at = None
+        self.validated_at = None
+        self.token = None
+        if cache_file is not None:
+            self._load_cache()
+        if self.token is None:
+            self.refresh()
+
+    def _load_cache(self):
+        """Uses the token in cache_file if it's for client_id and isn't
+        about to expire.
+        """
+        try:
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            logging.info("No cached app access token in %s", self.cache_file)
+            return
+
+        try:
+            if cache.get('client_id') != self.client_id:
+                logging.info("Cached app access token is for another client "
+                             "ID")
+                return
+            if cache['expires_at'] - EXPIRY_MARGIN <= time.time():
+                logging.info("Cached app access token is about to expire")
+                return
+            token = cache['access_token']
+            expires_at = cache['expires_at']
+            validated_at = cache.get('validated_at')
+        except (AttributeError, KeyError, TypeError):
+            logging.warning("Cached app access token in %s is malformed",
+                            self.cache_file)
+            return
+
+        logging.info("Using cached app access token from %s", self.cache_file)
+        self.token = token
+        self.expires_at = expires_at
+        self.validated_at = validated_at
+
+    def _save_cache(self):
+        """Saves the token into cache_file, readable only by the owner."""
+        if self.cache_file is None:
+            return
+        cache = {
+            'client_id': self.client_id,
+            'access_token': self.token,
+            'expires_at': self.expires_at,
+            'validated_at': self.validated_at,
+        }
+        # mkstemp creates the file readable only by the owner, with a
+        # unique name so that concurrent runs don't write the same file.
+        fd, tmp_file = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self.cache_file)),
+            prefix=f'{os.path.basename(self.cache_file)}.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_file, self.cache_file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+    def _remove_cache(self):
+        """Deletes cache_file."""
+        if self.cache_file is None:
+            return
+        try:
+            os.remove(self.cache_file)
+        except FileNotFoundError:
+            pass
 
     def _get_app_access_token(self, client_id, client_secret):
         """Gets a Twitch app access token."""
@@ -29,8 +120,8 @@ class OauthToken:
             'grant_type': 'client_credentials',
         }
 
-        resp = requests.post(f'{BASE_OAUTH2_URL}/token',
-                             data=app_access_tok_params)
+        resp = self.session.post(f'{BASE_OAUTH2_URL}/token',
+                                 data=app_access_tok_params)
         resp_json = resp.json()
 
         if resp.status_code >= 400:
@@ -39,18 +130,41 @@ class OauthToken:
             resp.raise_for_status()
 
         logging.info("Got an app access token")
+        self.expires_at = time.time() + resp_json['expires_in']
+        self.validated_at = None
         return resp_json['access_token']
 
+    def refresh(self):
+        """Replaces the token with a new app access token, e.g. after a
+        cached token turned out to be revoked.
+        """
+        self.token = self._get_app_access_token(self.client_id,
+                                                self.client_secret)
+        self._save_cache()
+
     def validate(self):
-        """Returns true if the token is valid, false otherwise."""
+        """Returns true if the token is valid, false otherwise.  A cached
+        token that was validated in the last VALIDATE_INTERVAL seconds
+        isn't validated again.
+        """
+        if (self.cache_file is not None and self.validated_at is not None
+                and time.time() - self.validated_at < VALIDATE_INTERVAL):
+            logging.info("Token %s was validated recently", self.token)
+            return True
+
         logging.info("Validating token %s", self.token)
         validation_headers = {'Authorization': f'OAuth {self.token}'}
 
-        resp = requests.get(f'{BASE_OAUTH2_URL}/validate',
-                            headers=validation_headers)
+        resp = self.session.get(f'{BASE_OAUTH2_URL}/validate',
+                                headers=validation_headers)
 
         is_valid = resp.status_code == 200
         logging.info("Token %s is valid: %s", self.token, is_valid)
+        if is_valid:
+            self.validated_at = time.time()
+            self._save_cache()
+        else:
+            self._remove_cache()
         return is_valid
 
     def revoke(self):
@@ -61,8 +175,8 @@ class OauthToken:
             'token': self.token,
         }
 
-        resp = requests.post(f'{BASE_OAUTH2_URL}/revoke',
-                             data=revoke_params)
+        resp = self.session.post(f'{BASE_OAUTH2_URL}/revoke',
+                                 data=revoke_params)
 
         if resp.status_code >= 400:
             resp_json = resp.json()
@@ -72,3 +186,4 @@ class OauthToken:
 
         logging.info("Token %s was sucessfully revoked", self.token)
         self.token = None
+        self._remove_cache()
@@ -0,0 +1,99 @@
+"""Module for the RateLimiter class.
+
+More info about the Twitch Helix rate limits can be found below:
+https://dev.twitch.tv/docs/api/guide#twitch-rate-limits
+"""
+
+import logging
+import threading
+import time
+
+DEFAULT_LIMIT = 800  # Helix points per minute for an app access token
+
+class RateLimiter:
+    """A token bucket shared by every thread sending requests to the
+    Twitch Helix API.  The bucket refills at Ratelimit-Limit points per
+    minute and is kept in sync with the Ratelimit-Remaining and
+    Ratelimit-Reset headers of each response, so requests are paced to
+    stay just under the limit instead of getting 429s.
+    """
+
+    def __init__(self, limit=DEFAULT_LIMIT):
+        """Initializes a new RateLimiter
+
+        :param limit: Points per minute to assume until a response says
+                      otherwise.
+        """
+        self.limit = limit
+        self._tokens = float(limit)
+        self._updated_at = time.monotonic()
+        self._blocked_until = None
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+    @property
+    def budget(self):
+        """Number of requests that can be sent right now."""
+        with self._cond:
+            self._refill()
+            return 0 if self._blocked_until is not None else int(self._tokens)
+
+    @property
+    def queue_depth(self):
+        """Number of threads waiting to send a request."""
+        with self._cond:
+            return self._waiting
+
+    def _refill(self):
+        """Adds the tokens gained since the last refill.  Must be called
+        while holding _cond.
+        """
+        now = time.monotonic()
+        if self._blocked_until is not None:
+            if now < self._blocked_until:
+                self._updated_at = now
+                return
+            self._blocked_until = None
+            self._tokens = float(self.limit)
+        rate = self.limit / 60
+        self._tokens = min(self.limit,
+                           self._tokens + (now - self._updated_at) * rate)
+        self._updated_at = now
+
+    def acquire(self):
+        """Waits until a request can be sent and takes a token for it."""
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    self._refill()
+                    if self._blocked_until is None and self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    if self._blocked_until is not None:
+                        wait = self._blocked_until - time.monotonic()
+                    else:
+                        wait = (1 - self._tokens) / (self.limit / 60)
+                    logging.debug("Waiting %.2fs for the Helix rate limit, "
+                                  "%s request(s) waiting", wait,
+                                  self._waiting)
+                    self._cond.wait(max(wait, 0))
+            finally:
+                self._waiting -= 1
+
+    def update(self, headers):
+        """Syncs the bucket with the Ratelimit headers of a response."""
+        if 'Ratelimit-Remaining' not in headers:
+            return
+        with self._cond:
+            self._refill()
+            if 'Ratelimit-Limit' in headers:
+                self.limit = int(headers['Ratelimit-Limit'])
+            remaining = int(headers['Ratelimit-Remaining'])
+            self._tokens = min(self._tokens, remaining)
+            if remaining == 0 and 'Ratelimit-Reset' in headers:
+                reset_in = int(headers['Ratelimit-Reset']) - time.time()
+                self._blocked_until = time.monotonic() + max(reset_in, 0)
+                logging.warning("Helix rate limit used up, waiting %.2fs",
+                                reset_in)
+            self._cond.notify_all()
@@ -0,0 +1,42 @@
+"""Contains helpers for the RFC 3339 timestamps used by Twitch."""
+
+from datetime import datetime, timedelta, timezone
+import re
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+_TIMESTAMP_RE = re.compile(
+    r'(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})[Tt ]'
+    r'(?P<hour>\d{2}):(?P<minute>\d{2}):(?P<second>\d{2})'
+    r'(?P<fraction>\.\d+)?'
+    r'(?:(?P<utc>[Zz])|(?P<sign>[+-])(?P<offset_hour>\d{2}):'
+    r'(?P<offset_minute>\d{2}))$')
+
+def parse_timestamp(timestamp):
+    """Returns the Unix time of an RFC 3339 timestamp, e.g.
+    2019-08-19T22:34:18Z, 2019-08-19T22:34:18.250Z, or
+    2019-08-19T15:34:18-07:00.
+
+    :raises ValueError: When the timestamp isn't in RFC 3339 format.
+    """
+    match = _TIMESTAMP_RE.match(timestamp)
+    if match is None:
+        raise ValueError(f"{timestamp} isn't an RFC 3339 timestamp")
+    tzinfo = timezone.utc
+    if match.group('utc') is None:
+        offset = timedelta(hours=int(match.group('offset_hour')),
+                           minutes=int(match.group('offset_minute')))
+        tzinfo = timezone(-offset if match.group('sign') == '-' else offset)
+    unix_time = datetime(
+        int(match.group('year')), int(match.group('month')),
+        int(match.group('day')), int(match.group('hour')),
+        int(match.group('minute')), int(match.group('second')),
+        tzinfo=tzinfo).timestamp()
+    if match.group('fraction') is not None:
+        unix_time += float(match.group('fraction'))
+    return unix_time
+
+def format_timestamp(unix_time):
+    """Returns the RFC 3339 timestamp of a Unix time."""
+    return datetime.fromtimestamp(unix_time, timezone.utc).strftime(
+        TIMESTAMP_FORMAT)
@@ -0,0 +1,83 @@
+"""Module for the ViewCountCache class."""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from timestamps import parse_timestamp
+
+DEFAULT_TTL = 3600  # Seconds before a cached view count is refreshed
+DEFAULT_SETTLED_AGE = 7 * 24 * 3600  # Age in seconds of a VOD whose views
+                                     # are considered final
+
+class ViewCountCache:
+    """An on-disk SQLite cache of the view counts of Twitch videos, keyed
+    by video ID.
+
+    A cached view count is refreshed once it's older than ttl, unless
+    the video was already older than settled_age when its view count was
+    fetched.  The view counts of those videos barely change anymore, so
+    they're always served from the cache.
+    """
+
+    def __init__(self, db_file, ttl=DEFAULT_TTL,
+                 settled_age=DEFAULT_SETTLED_AGE):
+        """Initializes a new ViewCountCache
+
+        :param db_file: Path of the SQLite database file.
+        :param ttl: Seconds before a cached view count is refreshed.
+        :param settled_age: Age in seconds of a video at which its view
+                            count is never refreshed.
+        """
+        self.ttl = ttl
+        self.settled_age = settled_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS video_views ('
+                'video_id TEXT PRIMARY KEY, '
+                'view_count INTEGER NOT NULL, '
+                'created_at REAL NOT NULL, '
+                'fetched_at REAL NOT NULL)')
+
+    def get_many(self, video_ids):
+        """Returns a dictionary of video IDs to view counts of the videos
+        that have a fresh view count in the cache.
+        """
+        now = time.time()
+        video_views = {}
+        with self._lock:
+            for i in range(0, len(video_ids), 500):
+                batch = video_ids[i:i + 500]
+                rows = self._conn.execute(
+                    'SELECT video_id, view_count FROM video_views '
+                    f'WHERE video_id IN ({",".join("?" * len(batch))}) '
+                    'AND (fetched_at > ? OR fetched_at - created_at >= ?)',
+                    (*batch, now - self.ttl, self.settled_age))
+                video_views.update(rows)
+        logging.info("Found %s of %s video(s) in the view count cache",
+                     len(video_views), len(video_ids))
+        return video_views
+
+    def put_many(self, videos):
+        """Saves the view counts of videos.
+
+        :param videos: List of info of videos recieved from the Twitch
+                       Helix API.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO video_views '
+                '(video_id, view_count, created_at, fetched_at) '
+                'VALUES (?, ?, ?, ?)',
+                [(video['id'], video['view_count'],
+                  parse_timestamp(video['created_at']), now)
+                 for video in videos])
+
+    def close(self):
+        """Closes the database."""
+        with self._lock:
+            self._conn.close()
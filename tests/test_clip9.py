@@ -1,6 +1,8 @@
 """Tests the clip9 module."""
 
 from configparser import ConfigParser
+import os
+import subprocess
 import sys
 
 import pytest
@@ -222,3 +224,76 @@ def test__parse_credentials_cfg_no_secret_key_exit():
     config.read_string(cfg_string)
     credentials = clip9._parse_credentials_cfg(config)
     assert credentials is None
+
+def test__parse_args_download_workers_default_success():
+    sys.argv = ['clip9.py', 'result.mp4', 'cloud9']
+    args = clip9._parse_args()
+    assert args.download_workers == 4
+
+def test__parse_args_download_workers_short_success():
+    sys.argv = ['clip9.py', 'result.mp4', 'cloud9', '-w', '8']
+    args = clip9._parse_args()
+    assert args.download_workers == 8
+
+def test__parse_args_fetch_workers_short_success():
+    sys.argv = ['clip9.py', 'result.mp4', 'cloud9', '-f', '8']
+    args = clip9._parse_args()
+    assert args.fetch_workers == 8
+
+def test__parse_args_pipeline_short_success():
+    sys.argv = ['clip9.py', 'result.mp4', 'cloud9', '-p']
+    args = clip9._parse_args()
+    assert args.pipeline is True
+
+def test__parse_args_budget_short_success():
+    sys.argv = ['clip9.py', 'result.mp4', 'cloud9', '-D', '90.5', '-N', '10']
+    args = clip9._parse_args()
+    assert args.max_duration == 90.5
+    assert args.max_clips == 10
+
+def test__parse_args_dry_run_short_success():
+    sys.argv = ['clip9.py', 'result.mp4', 'cloud9', '-n']
+    args = clip9._parse_args()
+    assert args.dry_run is True
+
+def test__print_clips_clips_prints_ratings_and_total(capsys):
+    clip9._print_clips(iter([
+        {'id': 'RandomClip1', 'broadcaster_name': 'Sabradina',
+         'rating': 1.25, 'duration': 30.0},
+        {'id': 'RandomClip2', 'broadcaster_name': 'Sabradina2',
+         'rating': 2.5, 'duration': 12.5},
+    ]))
+    assert capsys.readouterr().out == (
+        "   1.250   30.0s Sabradina RandomClip1\n"
+        "   2.500   12.5s Sabradina2 RandomClip2\n"
+        "2 clip(s), 42.5s\n")
+
+def test_import_clip9_no_moviepy_import():
+    clip9_dir = os.path.dirname(clip9.__file__)
+    subprocess.run([sys.executable, '-c',
+                    "import sys, clip9; "
+                    "assert 'moviepy' not in sys.modules"],
+                   cwd=clip9_dir, check=True)
+
+def test__parse_args_token_cache_short_success():
+    sys.argv = ['clip9.py', 'result.mp4', 'cloud9', '-t', 'token.json', '-k']
+    args = clip9._parse_args()
+    assert args.token_cache == 'token.json'
+    assert args.keep_token is True
+
+def test__parse_args_metrics_files_short_success():
+    sys.argv = ['clip9.py', 'result.mp4', 'cloud9', '-M', 'metrics.json',
+                '-E', 'clip9.prom']
+    args = clip9._parse_args()
+    assert args.metrics_file == 'metrics.json'
+    assert args.prometheus_file == 'clip9.prom'
+
+def test__parse_args_encoding_profile_short_success():
+    sys.argv = ['clip9.py', 'result.mp4', 'cloud9', '-Q', 'fast']
+    args = clip9._parse_args()
+    assert args.encoding_profile == 'fast'
+
+def test__parse_args_unknown_encoding_profile_exit():
+    sys.argv = ['clip9.py', 'result.mp4', 'cloud9', '-Q', 'fastest']
+    with pytest.raises(SystemExit):
+        clip9._parse_args()
@@ -0,0 +1,101 @@
+"""Tests the clipcache module."""
+
+import os
+
+from clipcache import ClipCache
+
+def _write_clip(cache_dir, clip_id, size):
+    with open(f'{cache_dir}/{clip_id}.mp4', 'wb') as f:
+        f.write(b'a' * size)
+
+def test_get_not_cached_ret_false(tmp_path):
+    cache = ClipCache(str(tmp_path))
+    assert cache.get('RandomClip1') is False
+
+def test_get_cached_ret_true(tmp_path):
+    _write_clip(tmp_path, 'RandomClip1', 10)
+    cache = ClipCache(str(tmp_path))
+    cache.put('RandomClip1')
+    assert cache.get('RandomClip1') is True
+
+def test_get_file_wrong_size_ret_false(tmp_path):
+    _write_clip(tmp_path, 'RandomClip1', 10)
+    cache = ClipCache(str(tmp_path))
+    cache.put('RandomClip1')
+    _write_clip(tmp_path, 'RandomClip1', 5)
+    assert cache.get('RandomClip1') is False
+
+def test_get_file_not_in_index_ret_false(tmp_path):
+    _write_clip(tmp_path, 'RandomClip1', 10)
+    cache = ClipCache(str(tmp_path))
+    assert cache.get('RandomClip1') is False
+
+def test_save_new_cache_loads_index(tmp_path):
+    _write_clip(tmp_path, 'RandomClip1', 10)
+    cache = ClipCache(str(tmp_path))
+    cache.put('RandomClip1')
+    cache.save()
+    assert ClipCache(str(tmp_path)).get('RandomClip1') is True
+
+def test_evict_over_budget_deletes_least_recently_used(tmp_path):
+    cache = ClipCache(str(tmp_path), max_bytes=25)
+    for clip_id in ['RandomClip1', 'RandomClip2', 'RandomClip3']:
+        _write_clip(tmp_path, clip_id, 10)
+        cache.put(clip_id)
+    cache.get('RandomClip1')
+
+    evicted = cache.evict()
+    assert evicted == ['RandomClip2']
+    assert not os.path.exists(f'{tmp_path}/RandomClip2.mp4')
+    assert cache.size() == 20
+
+def test_evict_keep_clips_not_deleted(tmp_path):
+    cache = ClipCache(str(tmp_path), max_bytes=15)
+    for clip_id in ['RandomClip1', 'RandomClip2']:
+        _write_clip(tmp_path, clip_id, 10)
+        cache.put(clip_id)
+
+    evicted = cache.evict(keep={'RandomClip1'})
+    assert evicted == ['RandomClip2']
+    assert os.path.exists(f'{tmp_path}/RandomClip1.mp4')
+
+def test_evict_no_budget_deletes_nothing(tmp_path):
+    cache = ClipCache(str(tmp_path))
+    _write_clip(tmp_path, 'RandomClip1', 10)
+    cache.put('RandomClip1')
+    assert cache.evict() == []
+
+def test_save_other_run_saved_keeps_its_clips(tmp_path):
+    _write_clip(tmp_path, 'RandomClip1', 10)
+    _write_clip(tmp_path, 'RandomClip2', 10)
+    cache1 = ClipCache(str(tmp_path))
+    cache2 = ClipCache(str(tmp_path))
+    cache1.put('RandomClip1')
+    cache2.put('RandomClip2')
+    cache1.save()
+    cache2.save()
+    cache = ClipCache(str(tmp_path))
+    assert cache.get('RandomClip1') is True
+    assert cache.get('RandomClip2') is True
+
+def test_save_evicted_clip_not_added_back(tmp_path):
+    _write_clip(tmp_path, 'RandomClip1', 10)
+    _write_clip(tmp_path, 'RandomClip2', 10)
+    cache = ClipCache(str(tmp_path))
+    cache.put('RandomClip1')
+    cache.put('RandomClip2')
+    cache.save()
+    cache = ClipCache(str(tmp_path), max_bytes=10)
+    cache.get('RandomClip2')
+    assert cache.evict() == ['RandomClip1']
+    cache.save()
+    assert set(ClipCache(str(tmp_path))._index) == {'RandomClip2'}
+
+def test_save_leaves_no_temporary_files(tmp_path):
+    _write_clip(tmp_path, 'RandomClip1', 10)
+    cache = ClipCache(str(tmp_path))
+    cache.put('RandomClip1')
+    cache.save()
+    cache.save()
+    assert sorted(os.listdir(tmp_path)) == [ClipCache.INDEX_FILE_NAME,
+                                            'RandomClip1.mp4']
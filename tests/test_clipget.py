@@ -1,17 +1,18 @@
 """Tests the clipget module."""
 
 import json
+import threading
 from unittest.mock import Mock
+from urllib.parse import parse_qs, urlparse
 
 import pytest
 import requests
 import responses
-from twitch import TwitchHelix
-from twitch.resources import Clip
-from twitch.resources import Video
 
 from constants import BASE_HELIX_URL
-from clipget import ClipGetter
+from clipget import ClipGetter, DEFAULT_QUEUE_SIZE
+from cliprecord import ClipRecord
+from timestamps import parse_timestamp
 
 example_client_id = 'uo6dggojyb8d6soh92zknwmi5ej1q2'
 example_app_access_token = 'prau3ol6mg5glgek8m89ec2s9q5i3i'
@@ -95,9 +96,7 @@ example_clips_resp = {
             'thumbnail_url': 'https://clips-media-assets.twitch.tv/157589950-preview-480x272.jpg'
         },
     ],
-    'pagination': {
-        'cursor': 'eyJiIjpudWxsLCJhIjoiIn0'
-    }
+    'pagination': {}
 }
 
 example_clips_resp2 = {
@@ -119,9 +118,7 @@ example_clips_resp2 = {
             'thumbnail_url': 'https://clips-media-assets.twitch.tv/157589949-preview-480x272.jpg'
         },
     ],
-    'pagination': {
-        'cursor': 'eyJiIjpudWxsLCJhIjoiIn0'
-    }
+    'pagination': {}
 }
 
 example_clips_resp_no_clips = {
@@ -152,6 +149,7 @@ def test__get_clips_valid_client_id_ret_clips():
     assert len(clips) == 2
     assert clips[0]['id'] == 'RandomClip1'
     assert clips[1]['id'] == 'RandomClip2'
+    assert all(isinstance(clip, ClipRecord) for clip in clips)
 
 @responses.activate
 def test__get_clips_valid_oauth_token_ret_clips():
@@ -202,27 +200,157 @@ def test__get_clips_invalid_client_id_and_token_throw_exception():
         getter._get_clips(example_users_list[0]["_id"],
                           example_users_list[0]["name"])
 
-def test__get_clip_video_views_clip_empty_video_id_ret_900():
-    clip = Clip()
-    clip.id = 'AwkwardHelplessSalamanderSwiftRage'
-    clip.video_id = ''
+@responses.activate
+def test__get_clips_many_pages_ret_all_clips():
+    full_page = {
+        'data': [dict(example_clips_resp['data'][0], id=f'Clip{i}')
+                 for i in range(100)],
+        'pagination': {'cursor': 'eyJiIjpudWxsLCJhIjoiIn0'}
+    }
+    def clips_callback(request):
+        if 'after=eyJiIjpudWxsLCJhIjoiIn0' in request.url:
+            return (200, {}, json.dumps(example_clips_resp))
+        return (200, {}, json.dumps(full_page))
+    responses.add_callback(responses.GET,
+                           f'{BASE_HELIX_URL}/clips',
+                           callback=clips_callback,
+                           content_type='application/json')
+
+    getter = ClipGetter(example_users_list)
+    clips = getter._get_clips(example_users_list[0]["_id"],
+                              example_users_list[0]["name"],
+                              oauth_token=example_app_access_token)
+    assert len(responses.calls) == 2
+    assert len(clips) == 102
+
+@responses.activate
+def test__get_clips_short_page_with_cursor_gets_next_page():
+    short_page = dict(example_clips_resp,
+                      pagination={'cursor': 'eyJiIjpudWxsLCJhIjoiIn0'})
+    def clips_callback(request):
+        if 'after=eyJiIjpudWxsLCJhIjoiIn0' in request.url:
+            return (200, {}, json.dumps(example_clips_resp2))
+        return (200, {}, json.dumps(short_page))
+    responses.add_callback(responses.GET,
+                           f'{BASE_HELIX_URL}/clips',
+                           callback=clips_callback,
+                           content_type='application/json')
+
+    getter = ClipGetter(example_users_list)
+    clips = getter._get_clips(example_users_list[0]["_id"],
+                              example_users_list[0]["name"],
+                              oauth_token=example_app_access_token)
+    assert len(responses.calls) == 2
+    assert len(clips) == 3
+
+@responses.activate
+def test_get_clips_clip_repeated_on_next_page_ret_clip_once():
+    first_page = dict(example_clips_resp,
+                      pagination={'cursor': 'eyJiIjpudWxsLCJhIjoiIn0'})
+    next_page = {'data': [example_clips_resp['data'][1],
+                          example_clips_resp2['data'][0]],
+                 'pagination': {}}
+    def clips_callback(request):
+        if 'after=eyJiIjpudWxsLCJhIjoiIn0' in request.url:
+            return (200, {}, json.dumps(next_page))
+        return (200, {}, json.dumps(first_page))
+    responses.add_callback(responses.GET,
+                           f'{BASE_HELIX_URL}/clips',
+                           callback=clips_callback,
+                           content_type='application/json')
+
+    getter = ClipGetter(example_users_list[:1])
+    getter._get_good_clips = Mock(side_effect=lambda clips: clips)
+    clips = getter.get_clips(oauth_token=example_app_access_token)
+    assert len(responses.calls) == 2
+    assert [clip['id'] for clip in clips] == ['RandomClip1', 'RandomClip2',
+                                              'RandomClip3']
+
+@responses.activate
+def test__iter_clip_pages_max_clips_stops_early():
+    responses.add(responses.GET,
+                  f'{BASE_HELIX_URL}/clips',
+                  body=json.dumps(example_clips_resp),
+                  status=200,
+                  content_type='application/json')
+
+    getter = ClipGetter(example_users_list, max_clips=2)
+    pages = list(getter._iter_clip_pages(example_users_list[0]["_id"],
+                                         example_users_list[0]["name"],
+                                         oauth_token=example_app_access_token))
+    assert len(responses.calls) == 1
+    assert 'first=2' in responses.calls[0].request.url
+    assert len(pages) == 1
+    assert len(pages[0]) == 2
+
+def test__get_good_clips_clip_empty_video_id_rated_with_900_views():
+    clip = dict(example_clips_resp['data'][0], video_id='')
+    getter = ClipGetter(example_users_list)
+    getter._get_videos_views = Mock()
+
+    clips = getter._get_good_clips([clip])
+    getter._get_videos_views.assert_not_called()
+    assert clips == [clip]
+    assert clip['rating'] == 250 / (900/9 + 100)
+
+def test__get_good_clips_video_not_found_rated_with_900_views():
+    clip = dict(example_clips_resp['data'][0])
+    getter = ClipGetter(example_users_list)
+    getter._get_videos_views = Mock(return_value={})
+
+    getter._get_good_clips([clip])
+    assert clip['rating'] == 250 / (900/9 + 100)
+
+@responses.activate
+def test__get_videos_views_many_videos_batches_lookups():
+    def videos_callback(request):
+        video_ids = parse_qs(urlparse(request.url).query)['id']
+        videos = [{'id': video_id, 'view_count': 10}
+                  for video_id in video_ids]
+        return (200, {}, json.dumps({'data': videos}))
+    responses.add_callback(responses.GET,
+                           f'{BASE_HELIX_URL}/videos',
+                           callback=videos_callback,
+                           content_type='application/json')
+    video_ids = [str(i) for i in range(150)]
+    getter = ClipGetter(example_users_list)
+
+    video_views = getter._get_videos_views(video_ids)
+    assert len(responses.calls) == 2
+    assert len(video_views) == 150
+
+@responses.activate
+def test__get_videos_views_same_videos_on_later_page_not_looked_up_again():
+    responses.add(responses.GET,
+                  f'{BASE_HELIX_URL}/videos',
+                  body=json.dumps({'data': [{'id': '1', 'view_count': 10}]}),
+                  status=200,
+                  content_type='application/json')
+    getter = ClipGetter(example_users_list)
+
+    assert getter._get_videos_views(['1', '2']) == {'1': 10}
+    assert getter._get_videos_views(['2', '1']) == {'1': 10}
+    assert len(responses.calls) == 1
+
+@responses.activate
+def test__get_videos_views_invalid_token_throw_exception():
+    responses.add(responses.GET,
+                  f'{BASE_HELIX_URL}/videos',
+                  body=json.dumps(example_clips_resp_invalid_client_id_and_token),
+                  status=401,
+                  content_type='application/json')
     getter = ClipGetter(example_users_list)
 
-    views = getter._get_clip_video_views(clip)
-    assert 900 == views
+    with pytest.raises(requests.HTTPError):
+        getter._get_videos_views(['205586603'])
 
-def test__get_clip_video_views_clip_video_id_ret_views():
-    clip = Clip()
-    clip.id = 'AwkwardHelplessSalamanderSwiftRage'
-    clip.video_id = '205586603'
-    video = Video()
-    video.view_count = 10
+def test__get_good_clips_same_video_looked_up_once():
     getter = ClipGetter(example_users_list)
-    getter.client = TwitchHelix(client_id=example_client_id)
-    getter.client.get_videos = Mock(return_value=[video])
+    getter._get_videos_views = Mock(return_value={'1234567': 450})
 
-    views = getter._get_clip_video_views(clip)
-    assert 10 == views
+    clips = getter._get_good_clips(example_clips_resp['data'])
+    getter._get_videos_views.assert_called_once_with(['1234567'])
+    assert len(clips) == 2
 
 def test__get_clip_rating_low_clip_views_high_avg_ret_gt_1():
     expected_rating = 1
@@ -238,15 +366,16 @@ def test__get_clip_rating_low_clip_views_high_avg_ret_lt_1():
 
 def test__get_good_clips_1_good_clip_ret_clips():
     getter = ClipGetter(example_users_list)
-    getter._get_clip_video_views = Mock(return_value=1350)
+    getter._get_videos_views = Mock(return_value={'1234567': 1350})
 
     clips = getter._get_good_clips(example_clips_resp['data'])
     assert len(clips) == 1
     assert clips[0]['id'] == 'RandomClip1'
+    assert example_clips_resp['data'][1]['rating'] < 1
 
 def test__get_good_clips_2_good_clip_ret_clips():
     getter = ClipGetter(example_users_list)
-    getter._get_clip_video_views = Mock(return_value=450)
+    getter._get_videos_views = Mock(return_value={'1234567': 450})
 
     clips = getter._get_good_clips(example_clips_resp['data'])
     assert len(clips) == 2
@@ -255,12 +384,38 @@ def test__get_good_clips_2_good_clip_ret_clips():
 
 def test_get_get_good_clips_lang_en_ret_less_clips():
     getter = ClipGetter(example_users_list, lang={'en'})
-    getter._get_clip_video_views = Mock(return_value=450)
+    getter._get_videos_views = Mock(return_value={'1234567': 450})
 
     clips = getter._get_good_clips(example_clips_resp['data'])
     assert len(clips) == 1
     assert clips[0]['id'] == 'RandomClip1'
 
+def test__get_good_clips_low_view_clips_videos_not_looked_up():
+    clips = [dict(example_clips_resp['data'][0], id='Clip1', video_id='1',
+                  view_count=99),
+             dict(example_clips_resp['data'][0], id='Clip2', video_id='2',
+                  view_count=500),
+             dict(example_clips_resp['data'][0], id='Clip3', video_id='2',
+                  view_count=20)]
+    getter = ClipGetter(example_users_list)
+    getter._get_videos_views = Mock(return_value={'2': 900})
+
+    good_clips = getter._get_good_clips(clips)
+    getter._get_videos_views.assert_called_once_with(['2'])
+    assert good_clips == [clips[1]]
+    assert clips[0]['rating'] == 0.99
+    assert clips[2]['rating'] == 0.2
+    assert getter.metrics.counters['vod_lookups_skipped'] == 1
+    assert getter.metrics.counters['clips_pruned'] == 2
+
+def test__get_good_clips_all_low_view_clips_no_lookup():
+    clips = [dict(example_clips_resp['data'][0], view_count=10)]
+    getter = ClipGetter(example_users_list)
+    getter._get_videos_views = Mock()
+
+    assert getter._get_good_clips(clips) == []
+    getter._get_videos_views.assert_not_called()
+
 def test__get_good_clips_no_clips_ret_no_clips():
     getter = ClipGetter(example_users_list)
 
@@ -270,7 +425,8 @@ def test__get_good_clips_no_clips_ret_no_clips():
 def test_get_clips_valid_client_id_ret_clips():
     getter = ClipGetter(example_users_list)
     ret_clips = [example_clips_resp['data'], example_clips_resp2['data']]
-    getter._get_clips = Mock(side_effect=ret_clips)
+    getter._iter_clip_pages = Mock(
+        side_effect=[iter([clips]) for clips in ret_clips])
     ret_good = [[example_clips_resp['data'][0]],
                 [example_clips_resp2['data'][0]]]
     getter._get_good_clips = Mock(side_effect=ret_good)
@@ -283,7 +439,8 @@ def test_get_clips_valid_client_id_ret_clips():
 def test_get_clips_valid_token_ret_clips():
     getter = ClipGetter(example_users_list)
     ret_clips = [example_clips_resp['data'], example_clips_resp2['data']]
-    getter._get_clips = Mock(side_effect=ret_clips)
+    getter._iter_clip_pages = Mock(
+        side_effect=[iter([clips]) for clips in ret_clips])
     ret_good = [[example_clips_resp['data'][0]],
                 [example_clips_resp2['data'][0]]]
     getter._get_good_clips = Mock(side_effect=ret_good)
@@ -296,9 +453,247 @@ def test_get_clips_valid_token_ret_clips():
 def test_get_clips_no_good_clips_ret_no_clips():
     getter = ClipGetter(example_users_list)
     ret_clips = [example_clips_resp['data'], example_clips_resp2['data']]
-    getter._get_clips = Mock(side_effect=ret_clips)
+    getter._iter_clip_pages = Mock(
+        side_effect=[iter([clips]) for clips in ret_clips])
     ret_good = [[], []]
     getter._get_good_clips = Mock(side_effect=ret_good)
 
     clips = getter.get_clips(oauth_token=example_app_access_token)
     assert len(clips) == 0
+
+def test_get_clips_many_workers_ret_clips_in_users_order():
+    getter = ClipGetter(example_users_list, max_workers=2)
+    ret_clips = {example_users_list[0]['_id']: example_clips_resp['data'],
+                 example_users_list[1]['_id']: example_clips_resp2['data']}
+    getter._iter_clip_pages = Mock(
+        side_effect=lambda user_id, *args: iter([ret_clips[user_id]]))
+    getter._get_good_clips = Mock(side_effect=lambda clips: clips)
+
+    clips = getter.get_clips(oauth_token=example_app_access_token)
+    assert [clip['id'] for clip in clips] == ['RandomClip1', 'RandomClip2',
+                                              'RandomClip3']
+
+def test_iter_clips_many_workers_yields_clips_in_users_order():
+    getter = ClipGetter(example_users_list, max_workers=2)
+    ret_clips = {example_users_list[0]['_id']: example_clips_resp['data'],
+                 example_users_list[1]['_id']: example_clips_resp2['data']}
+    getter._iter_clip_pages = Mock(
+        side_effect=lambda user_id, *args: iter([ret_clips[user_id]]))
+    getter._get_good_clips = Mock(side_effect=lambda clips: clips)
+
+    clips = getter.iter_clips(oauth_token=example_app_access_token,
+                              queue_size=1)
+    assert next(clips)['id'] == 'RandomClip1'
+    assert [clip['id'] for clip in clips] == ['RandomClip2', 'RandomClip3']
+
+def test_iter_clips_error_getting_clips_throws_exception():
+    getter = ClipGetter(example_users_list)
+    getter._iter_clip_pages = Mock(side_effect=requests.HTTPError)
+
+    with pytest.raises(requests.HTTPError):
+        list(getter.iter_clips(oauth_token=example_app_access_token))
+
+def test_get_clips_many_good_clips_workers_not_blocked():
+    users_list = [dict(example_users_list[0], _id=i, name=f'user{i}')
+                  for i in range(2)]
+    getter = ClipGetter(users_list, max_workers=2)
+    pages = [[dict(example_clips_resp['data'][0], id=f'Clip{i}')
+              for i in range(DEFAULT_QUEUE_SIZE + 1)]]
+    second_user_done = threading.Event()
+    def iter_user_good_clips(user, client_id, oauth_token):
+        if user['_id'] == 0:
+            # Can only finish if the second user isn't blocked on a full
+            # queue while this one's clips aren't taken yet
+            assert second_user_done.wait(timeout=5)
+        yield from pages
+        if user['_id'] == 1:
+            second_user_done.set()
+    getter._iter_user_good_clips = Mock(side_effect=iter_user_good_clips)
+
+    clips = getter.get_clips()
+    assert len(clips) == 2 * (DEFAULT_QUEUE_SIZE + 1)
+
+def test_iter_clips_closed_early_stops_users_without_fetching():
+    users_list = [dict(example_users_list[0], _id=i, name=f'user{i}')
+                  for i in range(3)]
+    getter = ClipGetter(users_list, max_workers=1)
+    pages = [[dict(example_clips_resp['data'][0], id=f'Clip{i}')
+              for i in range(5)]] * 3
+    getter._iter_user_good_clips = Mock(side_effect=lambda *args: iter(pages))
+
+    clips = getter.iter_clips(queue_size=2)
+    assert next(clips)['id'] == 'Clip0'
+    clips.close()
+    assert getter._iter_user_good_clips.call_count == 1
+
+@responses.activate
+def test__get_videos_views_view_cache_only_looks_up_missing():
+    responses.add(responses.GET,
+                  f'{BASE_HELIX_URL}/videos',
+                  body=json.dumps({'data': [{
+                      'id': '7654321', 'view_count': 20,
+                      'created_at': '2019-08-19T22:34:18Z'}]}),
+                  status=200,
+                  content_type='application/json')
+    view_cache = Mock()
+    view_cache.get_many.return_value = {'1234567': 10}
+    getter = ClipGetter(example_users_list, view_cache=view_cache)
+
+    video_views = getter._get_videos_views(['1234567', '7654321'])
+    assert video_views == {'1234567': 10, '7654321': 20}
+    assert 'id=7654321' in responses.calls[0].request.url
+    assert 'id=1234567' not in responses.calls[0].request.url
+    view_cache.put_many.assert_called_once()
+
+def test__iter_user_good_clips_indexed_window_fetches_only_new_clips():
+    getter = ClipGetter(example_users_list,
+                        started_at='2019-08-19T00:00:00Z',
+                        ended_at='2019-08-21T00:00:00Z')
+    getter.clip_index = Mock()
+    getter.clip_index.get_stale_clip_ids.return_value = []
+    getter.clip_index.get_coverage.return_value = (
+        parse_timestamp('2019-08-18T00:00:00Z'),
+        parse_timestamp('2019-08-20T00:00:00Z'))
+    getter.clip_index.get_clips.return_value = [
+        dict(example_clips_resp['data'][0], rating=1.5),
+        dict(example_clips_resp['data'][1], rating=0.5)]
+    getter._iter_clip_pages = Mock(
+        return_value=iter([example_clips_resp2['data']]))
+    getter._get_good_clips = Mock(side_effect=lambda clips: clips)
+
+    pages = list(getter._iter_user_good_clips(example_users_list[0]))
+    assert [[clip['id'] for clip in page] for page in pages] == [
+        ['RandomClip1', 'RandomClip3']]
+    args = getter._iter_clip_pages.call_args[0]
+    assert args[4:] == ('2019-08-20T00:00:00Z', '2019-08-21T00:00:00Z')
+    getter.clip_index.put_clips.assert_called_once_with(
+        example_clips_resp2['data'])
+    getter.clip_index.set_coverage.assert_called_once_with(
+        example_users_list[0]['_id'],
+        parse_timestamp('2019-08-18T00:00:00Z'),
+        parse_timestamp('2019-08-21T00:00:00Z'))
+
+def test__iter_user_good_clips_indexed_and_fetched_clips_merged_by_views():
+    getter = ClipGetter(example_users_list,
+                        started_at='2019-08-19T00:00:00Z',
+                        ended_at='2019-08-21T00:00:00Z')
+    getter.clip_index = Mock()
+    getter.clip_index.get_stale_clip_ids.return_value = []
+    getter.clip_index.get_coverage.return_value = (
+        parse_timestamp('2019-08-18T00:00:00Z'),
+        parse_timestamp('2019-08-20T00:00:00Z'))
+    getter.clip_index.get_clips.return_value = [
+        dict(example_clips_resp['data'][0], id='Indexed300', view_count=300,
+             rating=1.5),
+        dict(example_clips_resp['data'][0], id='Indexed100', view_count=100,
+             rating=1.5)]
+    fetched = [dict(example_clips_resp['data'][0], id='Fetched400',
+                    view_count=400),
+               dict(example_clips_resp['data'][0], id='Fetched200',
+                    view_count=200)]
+    getter._iter_clip_pages = Mock(return_value=iter([fetched[:1],
+                                                      fetched[1:]]))
+    getter._get_good_clips = Mock(side_effect=lambda clips: clips)
+
+    pages = list(getter._iter_user_good_clips(example_users_list[0]))
+    assert [[clip['id'] for clip in page] for page in pages] == [
+        ['Fetched400', 'Indexed300', 'Fetched200', 'Indexed100']]
+
+def test__iter_user_good_clips_window_in_index_no_fetch():
+    getter = ClipGetter(example_users_list,
+                        started_at='2019-08-19T00:00:00Z',
+                        ended_at='2019-08-20T00:00:00Z')
+    getter.clip_index = Mock()
+    getter.clip_index.get_stale_clip_ids.return_value = []
+    getter.clip_index.get_coverage.return_value = (
+        parse_timestamp('2019-08-18T00:00:00Z'),
+        parse_timestamp('2019-08-21T00:00:00Z'))
+    getter.clip_index.get_clips.return_value = [
+        dict(example_clips_resp['data'][0], rating=1.5)]
+    getter._iter_clip_pages = Mock()
+
+    pages = list(getter._iter_user_good_clips(example_users_list[0]))
+    assert [[clip['id'] for clip in page] for page in pages] == [
+        ['RandomClip1']]
+    getter._iter_clip_pages.assert_not_called()
+    getter.clip_index.set_coverage.assert_not_called()
+
+def test__iter_user_good_clips_fractional_coverage_no_overlap(mocker):
+    mocker.patch('clipget.time.time',
+                 return_value=parse_timestamp('2019-08-21T00:10:00Z') + 0.7)
+    getter = ClipGetter(example_users_list,
+                        started_at='2019-08-19T00:00:00Z',
+                        ended_at='2019-08-22T00:00:00Z')
+    getter.clip_index = Mock()
+    getter.clip_index.get_stale_clip_ids.return_value = []
+    getter.clip_index.get_coverage.return_value = (
+        parse_timestamp('2019-08-18T00:00:00Z'),
+        parse_timestamp('2019-08-20T00:00:00Z') + 0.5)
+    getter.clip_index.get_clips.return_value = []
+    getter._iter_clip_pages = Mock(return_value=iter([]))
+
+    list(getter._iter_user_good_clips(example_users_list[0]))
+    assert (getter.clip_index.get_clips.call_args[0][2]
+            == parse_timestamp('2019-08-20T00:00:00Z'))
+    args = getter._iter_clip_pages.call_args[0]
+    assert args[4] == '2019-08-20T00:00:00Z'
+    covered_to = getter.clip_index.set_coverage.call_args[0][2]
+    assert covered_to == parse_timestamp('2019-08-21T00:05:00Z')
+
+def test__iter_user_good_clips_stale_indexed_clips_fetched_and_rerated():
+    getter = ClipGetter(example_users_list,
+                        started_at='2019-08-19T00:00:00Z',
+                        ended_at='2019-08-20T00:00:00Z')
+    getter.clip_index = Mock()
+    getter.clip_index.get_coverage.return_value = (
+        parse_timestamp('2019-08-18T00:00:00Z'),
+        parse_timestamp('2019-08-21T00:00:00Z'))
+    getter.clip_index.get_clips.return_value = [
+        ClipRecord.from_dict(dict(clip, rating=0.5))
+        for clip in example_clips_resp['data']] + [
+        ClipRecord.from_dict(dict(example_clips_resp['data'][0],
+                                  id='Deleted', rating=0.5))]
+    getter.clip_index.get_stale_clip_ids.return_value = ['RandomClip1',
+                                                         'Deleted']
+    fresh_clip = ClipRecord.from_dict(dict(example_clips_resp['data'][0],
+                                           view_count=5000, rating=None))
+    getter._get_clips_by_id = Mock(return_value=[fresh_clip])
+    getter._get_videos_views = Mock(return_value={'1234567': 450})
+
+    pages = list(getter._iter_user_good_clips(example_users_list[0]))
+    getter._get_clips_by_id.assert_called_once_with(['RandomClip1',
+                                                     'Deleted'])
+    getter.clip_index.put_clips.assert_called_once_with([fresh_clip])
+    getter.clip_index.set_ratings.assert_called_once_with([fresh_clip])
+    assert pages == [[fresh_clip]]
+    assert fresh_clip['rating'] == 5000 / (450/9 + 100)
+
+@responses.activate
+def test__get_clips_by_id_many_clips_batches_lookups():
+    def clips_callback(request):
+        clip_ids = parse_qs(urlparse(request.url).query)['id']
+        clips = [dict(example_clips_resp['data'][0], id=clip_id)
+                 for clip_id in clip_ids[1:]]
+        return (200, {}, json.dumps({'data': clips}))
+    responses.add_callback(responses.GET,
+                           f'{BASE_HELIX_URL}/clips',
+                           callback=clips_callback,
+                           content_type='application/json')
+    getter = ClipGetter(example_users_list)
+
+    clips = getter._get_clips_by_id([f'Clip{i}' for i in range(150)])
+    assert len(responses.calls) == 2
+    assert len(clips) == 148
+    assert all(isinstance(clip, ClipRecord) for clip in clips)
+
+def test__iter_user_good_clips_started_at_with_offset_success():
+    getter = ClipGetter(example_users_list,
+                        started_at='2019-08-18T17:00:00.000-07:00',
+                        ended_at='2019-08-20T00:00:00Z')
+    getter.clip_index = Mock()
+    getter.clip_index.get_coverage.return_value = None
+    getter._iter_clip_pages = Mock(return_value=iter([]))
+
+    list(getter._iter_user_good_clips(example_users_list[0]))
+    args = getter._iter_clip_pages.call_args[0]
+    assert args[4:] == ('2019-08-19T00:00:00Z', '2019-08-20T00:00:00Z')
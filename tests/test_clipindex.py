@@ -0,0 +1,116 @@
+"""Tests the clipindex module."""
+
+import sqlite3
+
+from clipindex import ClipIndex
+from cliprecord import ClipRecord
+from timestamps import parse_timestamp
+
+example_clip = {
+    'id': 'RandomClip1',
+    'broadcaster_id': '5582097',
+    'broadcaster_name': 'Sabradina',
+    'video_id': '1234567',
+    'language': 'en',
+    'view_count': 250,
+    'created_at': '2019-08-19T22:34:18Z',
+}
+
+def test_get_coverage_not_indexed_ret_none(tmp_path):
+    index = ClipIndex(f'{tmp_path}/clips.db')
+    assert index.get_coverage(5582097) is None
+
+def test_set_coverage_ret_coverage(tmp_path):
+    index = ClipIndex(f'{tmp_path}/clips.db')
+    index.set_coverage(5582097, 100.0, 200.0)
+    assert index.get_coverage(5582097) == (100.0, 200.0)
+
+def test_get_clips_in_window_ret_clips_with_rating(tmp_path):
+    index = ClipIndex(f'{tmp_path}/clips.db')
+    index.put_clips([dict(example_clip, rating=1.5),
+                     dict(example_clip, id='RandomClip2')])
+    created_at = parse_timestamp(example_clip['created_at'])
+
+    clips = index.get_clips(5582097, created_at, created_at + 1)
+    clips.sort(key=lambda clip: clip['id'])
+    assert [clip['id'] for clip in clips] == ['RandomClip1', 'RandomClip2']
+    assert clips[0]['rating'] == 1.5
+    assert 'rating' not in clips[1]
+
+def test_put_clips_helix_clip_keeps_record_fields(tmp_path):
+    index = ClipIndex(f'{tmp_path}/clips.db')
+    index.put_clips([dict(example_clip, title='random1', rating=1.5)])
+    created_at = parse_timestamp(example_clip['created_at'])
+
+    clips = index.get_clips(5582097, created_at, created_at + 1)
+    assert isinstance(clips[0], ClipRecord)
+    assert clips[0].to_dict() == dict(example_clip, duration=None,
+                                      rating=1.5)
+
+def test_get_clips_outside_window_ret_no_clips(tmp_path):
+    index = ClipIndex(f'{tmp_path}/clips.db')
+    index.put_clips([example_clip])
+    created_at = parse_timestamp(example_clip['created_at'])
+
+    assert index.get_clips(5582097, created_at + 1, created_at + 2) == []
+
+def test_get_stale_clip_ids_just_fetched_ret_no_ids(tmp_path):
+    index = ClipIndex(f'{tmp_path}/clips.db')
+    index.put_clips([example_clip])
+    created_at = parse_timestamp(example_clip['created_at'])
+
+    assert index.get_stale_clip_ids(5582097, created_at,
+                                    created_at + 1) == []
+
+def test_get_stale_clip_ids_young_when_fetched_ret_ids(mocker, tmp_path):
+    created_at = parse_timestamp(example_clip['created_at'])
+    now = mocker.patch('clipindex.time.time', return_value=created_at + 60)
+    index = ClipIndex(f'{tmp_path}/clips.db', ttl=3600, settled_age=86400)
+    index.put_clips([example_clip])
+
+    now.return_value = created_at + 1800
+    assert index.get_stale_clip_ids(5582097, created_at,
+                                    created_at + 1) == []
+    now.return_value = created_at + 7200
+    assert index.get_stale_clip_ids(5582097, created_at,
+                                    created_at + 1) == ['RandomClip1']
+
+def test_get_stale_clip_ids_settled_when_fetched_ret_no_ids(mocker,
+                                                            tmp_path):
+    created_at = parse_timestamp(example_clip['created_at'])
+    now = mocker.patch('clipindex.time.time',
+                       return_value=created_at + 2 * 86400)
+    index = ClipIndex(f'{tmp_path}/clips.db', ttl=3600, settled_age=86400)
+    index.put_clips([example_clip])
+
+    now.return_value = created_at + 365 * 86400
+    assert index.get_stale_clip_ids(5582097, created_at,
+                                    created_at + 1) == []
+
+def test_set_ratings_keeps_clips_stale(mocker, tmp_path):
+    created_at = parse_timestamp(example_clip['created_at'])
+    now = mocker.patch('clipindex.time.time', return_value=created_at + 60)
+    index = ClipIndex(f'{tmp_path}/clips.db')
+    index.put_clips([example_clip])
+
+    now.return_value = created_at + 7200
+    index.set_ratings([dict(example_clip, rating=2.0)])
+    assert index.get_stale_clip_ids(5582097, created_at,
+                                    created_at + 1) == ['RandomClip1']
+    clips = index.get_clips(5582097, created_at, created_at + 1)
+    assert clips[0]['rating'] == 2.0
+
+def test___init___index_without_fetched_at_clips_stale(tmp_path):
+    conn = sqlite3.connect(f'{tmp_path}/clips.db')
+    with conn:
+        conn.execute('CREATE TABLE clips (clip_id TEXT PRIMARY KEY, '
+                     'broadcaster_id TEXT NOT NULL, '
+                     'created_at REAL NOT NULL, rating REAL, '
+                     'clip_json TEXT NOT NULL)')
+        conn.execute('INSERT INTO clips VALUES (?, ?, ?, ?, ?)',
+                     ('RandomClip1', '5582097', 100.0, 1.5, '{"id": '
+                      '"RandomClip1"}'))
+    conn.close()
+
+    index = ClipIndex(f'{tmp_path}/clips.db')
+    assert index.get_stale_clip_ids(5582097, 0, 200) == ['RandomClip1']
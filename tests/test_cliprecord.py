@@ -0,0 +1,74 @@
+"""Tests the cliprecord module."""
+
+import pytest
+
+from cliprecord import ClipRecord
+
+example_clip = {
+    'id': 'RandomClip1',
+    'url': 'https://clips.twitch.tv/AwkwardHelplessSalamanderSwiftRage',
+    'broadcaster_id': '5582097',
+    'broadcaster_name': 'Sabradina',
+    'creator_name': 'MrMarshall',
+    'video_id': '1234567',
+    'language': 'en',
+    'title': 'random1',
+    'view_count': 250,
+    'created_at': '2019-08-19T22:34:18Z',
+    'duration': 30.0,
+}
+
+def test_from_dict_helix_clip_ret_used_fields():
+    record = ClipRecord.from_dict(example_clip)
+    assert record.to_dict() == {
+        'id': 'RandomClip1',
+        'broadcaster_id': '5582097',
+        'broadcaster_name': 'Sabradina',
+        'language': 'en',
+        'view_count': 250,
+        'video_id': '1234567',
+        'duration': 30.0,
+        'created_at': '2019-08-19T22:34:18Z',
+    }
+
+def test_from_dict_to_dict_rated_clip_ret_same_dict():
+    clip = dict(ClipRecord.from_dict(example_clip).to_dict(), rating=1.5)
+    assert ClipRecord.from_dict(clip).to_dict() == clip
+
+def test___getitem___fields_ret_values():
+    record = ClipRecord.from_dict(example_clip)
+    assert record['id'] == 'RandomClip1'
+    assert record['view_count'] == 250
+    assert record.get('duration') == 30.0
+
+def test___getitem___unrated_or_dropped_key_throw_exception():
+    record = ClipRecord.from_dict(example_clip)
+    with pytest.raises(KeyError):
+        record['rating']
+    with pytest.raises(KeyError):
+        record['title']
+    assert record.get('rating', 0) == 0
+    assert 'rating' not in record
+    assert 'title' not in record
+
+def test___setitem___rating_ret_rated():
+    record = ClipRecord.from_dict(example_clip)
+    record['rating'] = 2.0
+    assert 'rating' in record
+    assert record['rating'] == 2.0
+    assert dict(record)['rating'] == 2.0
+
+def test___setitem___unknown_key_throw_exception():
+    record = ClipRecord.from_dict(example_clip)
+    with pytest.raises(KeyError):
+        record['title'] = 'random1'
+
+def test___init___slots_no_dict():
+    record = ClipRecord.from_dict(example_clip)
+    assert not hasattr(record, '__dict__')
+
+def test___eq___same_fields_ret_true():
+    assert ClipRecord.from_dict(example_clip) == ClipRecord.from_dict(
+        dict(example_clip, title='other'))
+    assert ClipRecord.from_dict(example_clip) != ClipRecord.from_dict(
+        dict(example_clip, view_count=1))
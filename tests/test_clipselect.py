@@ -0,0 +1,61 @@
+"""Tests the clipselect module."""
+
+from clipselect import select_clips
+
+def _clip(clip_id, rating, duration=30.0):
+    return {'id': clip_id, 'rating': rating, 'duration': duration}
+
+example_clips = [
+    _clip('A', 1.5, 30.0),
+    _clip('B', 4.0, 50.0),
+    _clip('C', 2.0, 20.0),
+    _clip('D', 3.0, 10.0),
+    _clip('E', 1.0, 5.0),
+]
+
+def _ids(selection):
+    clips, _ = selection
+    return [clip['id'] for clip in clips]
+
+def test_select_clips_no_budget_ret_all_clips_in_order():
+    assert _ids(select_clips(iter(example_clips))) == ['A', 'B', 'C', 'D',
+                                                       'E']
+
+def test_select_clips_max_clips_ret_highest_rated_in_order():
+    clips = select_clips(iter(example_clips), max_clips=3)
+    assert _ids(clips) == ['B', 'C', 'D']
+
+def test_select_clips_max_duration_ret_highest_rated_that_fit():
+    clips = select_clips(iter(example_clips), max_duration=80)
+    assert _ids(clips) == ['B', 'C', 'D']
+
+def test_select_clips_max_duration_lower_rated_clip_fills_gap():
+    # A doesn't fit after B, D and C, but E, rated lower, does.
+    clips = select_clips(iter(example_clips), max_duration=90)
+    assert _ids(clips) == ['B', 'C', 'D', 'E']
+    clips = select_clips(iter(reversed(example_clips)), max_duration=90)
+    assert _ids(clips) == ['E', 'D', 'C', 'B']
+
+def test_select_clips_both_budgets_ret_clips_within_both():
+    clips = select_clips(iter(example_clips), max_duration=200, max_clips=2)
+    assert _ids(clips) == ['B', 'D']
+
+def test_select_clips_same_rating_ret_earlier_clips():
+    clips = [_clip(str(i), 2.0) for i in range(5)]
+    assert _ids(select_clips(clips, max_clips=2)) == ['0', '1']
+
+def test_select_clips_first_clip_too_long_ret_shorter_clips():
+    clips = select_clips(iter(example_clips), max_duration=40)
+    assert _ids(clips) == ['C', 'D', 'E']
+
+def test_select_clips_both_budgets_skipped_clip_not_counted():
+    clips = select_clips(iter(example_clips), max_duration=40, max_clips=2)
+    assert _ids(clips) == ['C', 'D']
+
+def test_select_clips_every_clip_too_long_ret_no_clips():
+    clips, num_clips = select_clips(iter(example_clips), max_duration=1)
+    assert clips == []
+    assert num_clips == 5
+
+def test_select_clips_no_clips_ret_no_clips():
+    assert select_clips(iter([]), max_duration=60, max_clips=2) == ([], 0)
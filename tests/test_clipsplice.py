@@ -1,5 +1,7 @@
 """Tests the clipsplice module."""
 
+from concurrent.futures import ThreadPoolExecutor
+import os
 from unittest.mock import patch, mock_open
 
 import pytest
@@ -7,8 +9,9 @@ from pytest_mock import mocker
 import requests
 import responses
 
-from clipsplice import ClipSplicer
-from constants import BASE_GQL_URL
+from clipsplice import ClipSplicer, DOWNLOAD_TIMEOUT, TARGET_RESOLUTION
+from constants import BASE_GQL_URL, GQL_MAX_BATCH_SIZE
+from ffmpegtools import VideoInfo
 
 example_clip_list = [
     {
@@ -185,11 +188,16 @@ def test__download_clip_valid_url_success(mocker):
                   status=200,
                   content_type='binary/octet-stream')
     m = mocker.patch('builtins.open', mocker.mock_open())
+    replace = mocker.patch('os.replace')
 
     splicer = ClipSplicer(example_clip_list)
     splicer._download_clip(example_clip_list[0], path)
-    m.assert_called_with(f'{path}/{example_clip_list[0]["id"]}.mp4', 'wb')
+    m.assert_called_with(f'{path}/{example_clip_list[0]["id"]}.mp4.part',
+                         'wb')
     m().write.assert_called_once_with(b'a')
+    replace.assert_called_once_with(
+        f'{path}/{example_clip_list[0]["id"]}.mp4.part',
+        f'{path}/{example_clip_list[0]["id"]}.mp4')
 
 @responses.activate
 def test__download_clip_invalid_url_throws_exception(mocker):
@@ -222,3 +230,463 @@ def test__download_clip_invalid_path_throws_exception(mocker):
     splicer = ClipSplicer(example_clip_list)
     with pytest.raises(FileNotFoundError):
         splicer._download_clip(example_clip_list[0], path)
+
+def test__download_clips_all_success_ret_no_fails(mocker):
+    src_urls = {clip['id']: f'https://clips-media-assets2.twitch.tv/{i}.mp4'
+                for i, clip in enumerate(example_clip_list)}
+    mocker.patch('clipsplice.ClipSplicer._get_clip_src_urls',
+                 return_value=(src_urls, {}))
+    mocker.patch('clipsplice.ClipSplicer._download_clip')
+
+    splicer = ClipSplicer(example_clip_list, max_workers=2)
+    fail_list = splicer._download_clips('./')
+    assert fail_list == []
+    assert splicer._download_clip.call_count == 2
+
+def test__download_clips_some_fail_ret_fails_in_order(mocker):
+    src_urls = {example_clip_list[1]['id']:
+                'https://clips-media-assets2.twitch.tv/157589949.mp4'}
+    errors = {example_clip_list[0]['id']: requests.HTTPError()}
+    mocker.patch('clipsplice.ClipSplicer._get_clip_src_urls',
+                 return_value=(src_urls, errors))
+    def download_clip(clip, path, clip_src_url):
+        raise requests.HTTPError(f"Couldn't download clip {clip['id']}")
+    mocker.patch('clipsplice.ClipSplicer._download_clip',
+                 side_effect=download_clip)
+
+    splicer = ClipSplicer(example_clip_list, max_workers=2)
+    fail_list = splicer._download_clips('./')
+    assert fail_list == [example_clip_list[0]['id'],
+                         example_clip_list[1]['id']]
+
+@responses.activate
+def test__get_clip_src_urls_valid_and_missing_clips_ret_urls_and_errors():
+    body = (f'[{example_clip_resp.strip()[1:-1]},'
+            f'{example_no_clip_resp.strip()[1:-1]}]')
+    responses.add(responses.POST,
+                  BASE_GQL_URL,
+                  body=body,
+                  status=200,
+                  content_type='application/json')
+
+    splicer = ClipSplicer(example_clip_list)
+    src_urls, errors = splicer._get_clip_src_urls(
+        [clip['id'] for clip in example_clip_list])
+    assert len(responses.calls) == 1
+    assert src_urls == {example_clip_list[0]['id']:
+                        'https://clips-media-assets2.twitch.tv/157589949.mp4'}
+    assert list(errors) == [example_clip_list[1]['id']]
+
+@responses.activate
+def test__get_clip_src_urls_failed_connection_ret_all_errors():
+    responses.add(responses.POST,
+                  BASE_GQL_URL,
+                  status=400)
+
+    splicer = ClipSplicer(example_clip_list)
+    src_urls, errors = splicer._get_clip_src_urls(
+        [clip['id'] for clip in example_clip_list])
+    assert src_urls == {}
+    assert set(errors) == {clip['id'] for clip in example_clip_list}
+
+@responses.activate
+def test__get_clip_src_urls_many_clips_batches_requests():
+    clip_ids = [f'Clip{i}' for i in range(GQL_MAX_BATCH_SIZE + 1)]
+    responses.add(responses.POST,
+                  BASE_GQL_URL,
+                  body=example_clip_resp,
+                  status=200,
+                  content_type='application/json')
+
+    splicer = ClipSplicer(example_clip_list)
+    src_urls, errors = splicer._get_clip_src_urls(clip_ids)
+    assert len(responses.calls) == 2
+    assert len(src_urls) == 2
+
+@responses.activate
+def test__get_clip_src_urls_short_response_ret_errors_for_missing():
+    responses.add(responses.POST,
+                  BASE_GQL_URL,
+                  body=example_clip_resp,
+                  status=200,
+                  content_type='application/json')
+
+    splicer = ClipSplicer(example_clip_list)
+    src_urls, errors = splicer._get_clip_src_urls(
+        [clip['id'] for clip in example_clip_list])
+    assert list(src_urls) == [example_clip_list[0]['id']]
+    assert list(errors) == [example_clip_list[1]['id']]
+
+@responses.activate
+def test__get_clip_src_urls_object_response_ret_all_errors():
+    responses.add(responses.POST,
+                  BASE_GQL_URL,
+                  body='{"error": "Bad Request"}',
+                  status=200,
+                  content_type='application/json')
+
+    splicer = ClipSplicer(example_clip_list)
+    src_urls, errors = splicer._get_clip_src_urls(
+        [clip['id'] for clip in example_clip_list])
+    assert src_urls == {}
+    assert set(errors) == {clip['id'] for clip in example_clip_list}
+
+def test__download_clips_cached_clip_not_downloaded(mocker):
+    cache = mocker.Mock()
+    cache.get.side_effect = lambda clip_id: (
+        clip_id == example_clip_list[0]['id'])
+    src_urls = {example_clip_list[1]['id']:
+                'https://clips-media-assets2.twitch.tv/157589949.mp4'}
+    mocker.patch('clipsplice.ClipSplicer._get_clip_src_urls',
+                 return_value=(src_urls, {}))
+    mocker.patch('clipsplice.ClipSplicer._download_clip')
+
+    splicer = ClipSplicer(example_clip_list)
+    fail_list = splicer._download_clips('./', cache)
+    assert fail_list == []
+    splicer._get_clip_src_urls.assert_called_once_with(
+        [example_clip_list[1]['id']])
+    assert splicer._download_clip.call_count == 1
+    cache.put.assert_called_once_with(example_clip_list[1]['id'])
+
+@responses.activate
+def test__download_clip_truncated_throws_exception(mocker):
+    src_url = 'https://clips-media-assets2.twitch.tv/157589949.mp4'
+    responses.add(responses.GET,
+                  src_url,
+                  body='a',
+                  status=200,
+                  headers={'Content-Length': '2'},
+                  content_type='binary/octet-stream')
+    mocker.patch('builtins.open', mocker.mock_open())
+
+    splicer = ClipSplicer(example_clip_list)
+    with pytest.raises(requests.HTTPError):
+        splicer._download_clip(example_clip_list[0], './', src_url)
+
+example_video_info = VideoInfo('h264', 'High', 'yuv420p', 1920, 1080, 60.0,
+                               'aac', 48000, 'stereo')
+
+def test__can_stream_copy_same_h264_clips_ret_true(mocker):
+    mocker.patch('clipsplice.probe', return_value=example_video_info)
+
+    splicer = ClipSplicer(example_clip_list)
+    assert splicer._can_stream_copy('result.mp4', ['a.mp4', 'b.mp4'])
+
+def test__can_stream_copy_different_clips_ret_false(mocker):
+    mocker.patch('clipsplice.probe',
+                 side_effect=[example_video_info,
+                              example_video_info._replace(width=1280,
+                                                          height=720)])
+
+    splicer = ClipSplicer(example_clip_list)
+    assert not splicer._can_stream_copy('result.mp4', ['a.mp4', 'b.mp4'])
+
+def test__can_stream_copy_avi_result_ret_false(mocker):
+    mocker.patch('clipsplice.probe', return_value=example_video_info)
+
+    splicer = ClipSplicer(example_clip_list)
+    assert not splicer._can_stream_copy('result.avi', ['a.mp4', 'b.mp4'])
+
+def test__can_stream_copy_probe_fails_ret_false(mocker):
+    mocker.patch('clipsplice.probe',
+                 side_effect=[example_video_info, ValueError])
+
+    splicer = ClipSplicer(example_clip_list)
+    assert not splicer._can_stream_copy('result.mp4', ['a.mp4', 'b.mp4'])
+
+def test__max_fps_probes_each_file_once(mocker):
+    probe = mocker.patch('clipsplice.probe',
+                         side_effect=[example_video_info,
+                                      example_video_info._replace(fps=30.0)])
+
+    splicer = ClipSplicer(example_clip_list)
+    assert splicer._can_stream_copy('result.mp4', ['a.mp4', 'b.mp4']) is False
+    assert splicer._max_fps(['a.mp4', 'b.mp4']) == 60.0
+    assert probe.call_count == 2
+
+def test__render_only_resizes_clips_not_at_target_resolution(mocker):
+    mocker.patch('clipsplice.probe',
+                 side_effect=[example_video_info,
+                              example_video_info._replace(width=1280,
+                                                          height=720),
+                              ValueError])
+    video_file_clip = mocker.patch('moviepy.editor.VideoFileClip')
+    mocker.patch('clipsplice.ClipSplicer._splice_clips')
+
+    splicer = ClipSplicer(example_clip_list)
+    splicer._render('result.mp4', ['a.mp4', 'b.mp4', 'c.mp4'])
+    assert video_file_clip.call_args_list == [
+        mocker.call('a.mp4'),
+        mocker.call('b.mp4', target_resolution=TARGET_RESOLUTION),
+        mocker.call('c.mp4', target_resolution=TARGET_RESOLUTION)]
+    assert splicer.metrics.counters['clips_resized'] == 2
+
+def test__download_clips_iterator_downloads_and_lists_clips(mocker):
+    src_urls = {clip['id']: f'https://clips-media-assets2.twitch.tv/{i}.mp4'
+                for i, clip in enumerate(example_clip_list)}
+    mocker.patch('clipsplice.ClipSplicer._get_clip_src_urls',
+                 return_value=(src_urls, {}))
+    mocker.patch('clipsplice.ClipSplicer._download_clip')
+
+    splicer = ClipSplicer(iter(example_clip_list), max_workers=2)
+    fail_list = splicer._download_clips('./')
+    assert fail_list == []
+    assert splicer.clips_list == example_clip_list
+    assert splicer._download_clip.call_count == 2
+    splicer._get_clip_src_urls.assert_called_once_with(
+        [clip['id'] for clip in example_clip_list])
+
+def test__download_clips_iterator_src_url_error_ret_fail(mocker):
+    src_urls = {example_clip_list[1]['id']:
+                'https://clips-media-assets2.twitch.tv/157589949.mp4'}
+    errors = {example_clip_list[0]['id']: requests.HTTPError()}
+    mocker.patch('clipsplice.ClipSplicer._get_clip_src_urls',
+                 return_value=(src_urls, errors))
+    mocker.patch('clipsplice.ClipSplicer._download_clip')
+
+    splicer = ClipSplicer(iter(example_clip_list), max_workers=2)
+    fail_list = splicer._download_clips('./')
+    assert fail_list == [example_clip_list[0]['id']]
+    assert splicer._download_clip.call_count == 1
+
+def test__download_clips_iterator_src_url_lookup_raises_closes_iterator(
+        mocker):
+    mocker.patch('clipsplice.ClipSplicer._get_clip_src_urls',
+                 side_effect=requests.ConnectionError)
+    closed = []
+    def clips():
+        try:
+            yield from example_clip_list
+        finally:
+            closed.append(True)
+
+    splicer = ClipSplicer(clips(), max_workers=1)
+    with pytest.raises(requests.ConnectionError):
+        splicer._download_clips('./')
+    assert closed == [True]
+
+def test__render_segments_many_clips_bounded_open_clips(mocker, tmp_path):
+    open_clips = []
+    max_open_clips = []
+    def video_file_clip(file_name, **kwargs):
+        clip_file = mocker.Mock()
+        clip_file.close.side_effect = lambda: open_clips.remove(clip_file)
+        open_clips.append(clip_file)
+        return clip_file
+    def splice_clips(result_file_name, file_list, fps):
+        max_open_clips.append(len(open_clips))
+    mocker.patch('moviepy.editor.VideoFileClip', side_effect=video_file_clip)
+    mocker.patch('clipsplice.ClipSplicer._splice_clips',
+                 side_effect=splice_clips)
+    mocker.patch('clipsplice.ClipSplicer._max_fps', return_value=30.0)
+    mocker.patch('clipsplice.probe', return_value=example_video_info)
+    concat = mocker.patch('clipsplice.concat_copy')
+
+    splicer = ClipSplicer(example_clip_list, render_window=2)
+    splicer._render_segments('result.mp4',
+                             [f'{i}.mp4' for i in range(5)], str(tmp_path))
+    assert max_open_clips == [2, 2, 1]
+    assert open_clips == []
+    segment_names = concat.call_args[0][0]
+    assert len(segment_names) == 3
+    assert all(name.endswith('.mp4') for name in segment_names)
+    assert list(tmp_path.iterdir()) == []
+
+def test__render_segments_clip_without_audio_gets_silence(mocker, tmp_path):
+    clip_files = {}
+    def video_file_clip(file_name, **kwargs):
+        clip_files[file_name] = mocker.Mock(duration=2.0)
+        if file_name == 'c.mp4':
+            clip_files[file_name].audio = None
+        return clip_files[file_name]
+    splice = mocker.patch('clipsplice.ClipSplicer._splice_clips')
+    mocker.patch('moviepy.editor.VideoFileClip', side_effect=video_file_clip)
+    mocker.patch('clipsplice.ClipSplicer._max_fps', return_value=30.0)
+    mocker.patch('clipsplice.probe', return_value=example_video_info)
+    mocker.patch('clipsplice.concat_copy')
+
+    splicer = ClipSplicer(example_clip_list, render_window=1)
+    splicer._render_segments('result.mp4', ['c.mp4', 'a.mp4'], str(tmp_path))
+    assert clip_files['c.mp4'].set_audio.call_count == 1
+    clip_files['a.mp4'].set_audio.assert_not_called()
+    assert splice.call_args_list[0][0][1] == [
+        clip_files['c.mp4'].set_audio.return_value]
+    assert splice.call_args_list[1][0][1] == [clip_files['a.mp4']]
+    clip_files['c.mp4'].close.assert_called_once_with()
+
+def test__render_normalized_many_clips_joined_in_order(mocker, tmp_path):
+    mocker.patch('clipsplice.ProcessPoolExecutor', ThreadPoolExecutor)
+    normalize = mocker.patch('clipsplice._normalize_clip',
+                             side_effect=lambda file_name, result, fps,
+                             profile_name, threads, scale: (result, 60))
+    mocker.patch('clipsplice.ClipSplicer._max_fps', return_value=30.0)
+    mocker.patch('clipsplice.probe', return_value=example_video_info)
+    concat = mocker.patch('clipsplice.concat_copy')
+
+    splicer = ClipSplicer(example_clip_list, render_workers=2)
+    splicer._render_normalized('result.webm', ['a.mp4', 'b.mp4', 'c.mp4'],
+                               str(tmp_path))
+    assert normalize.call_count == 3
+    assert [call[0][0] for call in normalize.call_args_list] == [
+        'a.mp4', 'b.mp4', 'c.mp4']
+    assert [call[0][5] for call in normalize.call_args_list] == [
+        False, False, False]
+    normalized_names = concat.call_args[0][0]
+    assert [name[-6:] for name in normalized_names] == [
+        '0.webm', '1.webm', '2.webm']
+    assert splicer.metrics.counters['encode_frames'] == 180
+    assert list(tmp_path.iterdir()) == []
+
+@responses.activate
+def test__download_clip_part_file_resumes_with_range(tmp_path):
+    src_url = 'https://clips-media-assets2.twitch.tv/157589949.mp4'
+    clip_id = example_clip_list[0]['id']
+    with open(f'{tmp_path}/{clip_id}.mp4.part', 'wb') as f:
+        f.write(b'ab')
+    responses.add(responses.GET,
+                  src_url,
+                  body='cd',
+                  status=206,
+                  headers={'Content-Range': 'bytes 2-3/4'},
+                  content_type='binary/octet-stream')
+
+    splicer = ClipSplicer(example_clip_list)
+    splicer._download_clip(example_clip_list[0], str(tmp_path), src_url)
+    assert responses.calls[0].request.headers['Range'] == 'bytes=2-'
+    with open(f'{tmp_path}/{clip_id}.mp4', 'rb') as f:
+        assert f.read() == b'abcd'
+    assert not os.path.exists(f'{tmp_path}/{clip_id}.mp4.part')
+
+@responses.activate
+def test__download_clip_wrong_range_downloads_again(tmp_path):
+    src_url = 'https://clips-media-assets2.twitch.tv/157589949.mp4'
+    clip_id = example_clip_list[0]['id']
+    with open(f'{tmp_path}/{clip_id}.mp4.part', 'wb') as f:
+        f.write(b'ab')
+    responses.add(responses.GET,
+                  src_url,
+                  body='bc',
+                  status=206,
+                  headers={'Content-Range': 'bytes 1-2/4'},
+                  content_type='binary/octet-stream')
+    responses.add(responses.GET,
+                  src_url,
+                  body='abcd',
+                  status=200,
+                  content_type='binary/octet-stream')
+
+    splicer = ClipSplicer(example_clip_list)
+    splicer._download_clip(example_clip_list[0], str(tmp_path), src_url)
+    assert 'Range' not in responses.calls[1].request.headers
+    with open(f'{tmp_path}/{clip_id}.mp4', 'rb') as f:
+        assert f.read() == b'abcd'
+
+@responses.activate
+def test__download_clip_unasked_range_throw_exception(tmp_path):
+    src_url = 'https://clips-media-assets2.twitch.tv/157589949.mp4'
+    responses.add(responses.GET,
+                  src_url,
+                  body='cd',
+                  status=206,
+                  headers={'Content-Range': 'bytes 2-3/4'},
+                  content_type='binary/octet-stream')
+
+    splicer = ClipSplicer(example_clip_list)
+    with pytest.raises(requests.HTTPError):
+        splicer._download_clip(example_clip_list[0], str(tmp_path), src_url)
+    assert os.listdir(tmp_path) == []
+
+@responses.activate
+def test__download_clip_range_ignored_downloads_again(tmp_path):
+    src_url = 'https://clips-media-assets2.twitch.tv/157589949.mp4'
+    clip_id = example_clip_list[0]['id']
+    with open(f'{tmp_path}/{clip_id}.mp4.part', 'wb') as f:
+        f.write(b'ab')
+    responses.add(responses.GET,
+                  src_url,
+                  body='abcd',
+                  status=200,
+                  content_type='binary/octet-stream')
+
+    splicer = ClipSplicer(example_clip_list)
+    splicer._download_clip(example_clip_list[0], str(tmp_path), src_url)
+    with open(f'{tmp_path}/{clip_id}.mp4', 'rb') as f:
+        assert f.read() == b'abcd'
+
+@responses.activate
+def test__download_clip_incomplete_range_keeps_part_file(tmp_path):
+    src_url = 'https://clips-media-assets2.twitch.tv/157589949.mp4'
+    clip_id = example_clip_list[0]['id']
+    with open(f'{tmp_path}/{clip_id}.mp4.part', 'wb') as f:
+        f.write(b'ab')
+    responses.add(responses.GET,
+                  src_url,
+                  body='c',
+                  status=206,
+                  headers={'Content-Range': 'bytes 2-3/4'},
+                  content_type='binary/octet-stream')
+
+    splicer = ClipSplicer(example_clip_list)
+    with pytest.raises(requests.HTTPError):
+        splicer._download_clip(example_clip_list[0], str(tmp_path), src_url)
+    assert not os.path.exists(f'{tmp_path}/{clip_id}.mp4')
+    with open(f'{tmp_path}/{clip_id}.mp4.part', 'rb') as f:
+        assert f.read() == b'abc'
+
+def test__download_clip_connection_reset_throws_http_error(mocker, tmp_path):
+    resp = mocker.Mock(status_code=200, headers={})
+    resp.iter_content.side_effect = requests.ConnectionError("reset")
+    splicer = ClipSplicer(example_clip_list)
+    mocker.patch.object(splicer.session, 'get', return_value=resp)
+
+    with pytest.raises(requests.HTTPError):
+        splicer._download_clip(example_clip_list[0], str(tmp_path),
+                               'https://clips-media-assets2.twitch.tv/a.mp4')
+    assert splicer.session.get.call_args[1]['timeout'] == DOWNLOAD_TIMEOUT
+    assert os.path.exists(
+        f'{tmp_path}/{example_clip_list[0]["id"]}.mp4.part')
+
+def test__download_clips_connect_timeout_ret_fail(mocker, tmp_path):
+    src_urls = {clip['id']: f'https://clips-media-assets2.twitch.tv/{i}.mp4'
+                for i, clip in enumerate(example_clip_list)}
+    mocker.patch('clipsplice.ClipSplicer._get_clip_src_urls',
+                 return_value=(src_urls, {}))
+    splicer = ClipSplicer(example_clip_list)
+    mocker.patch.object(splicer.session, 'get',
+                        side_effect=requests.ConnectTimeout())
+
+    fail_list = splicer._download_clips(str(tmp_path))
+    assert fail_list == [clip['id'] for clip in example_clip_list]
+
+def test__download_clips_duplicate_clips_downloaded_once(mocker):
+    clips = [example_clip_list[0], dict(example_clip_list[0]),
+             example_clip_list[1]]
+    src_urls = {clip['id']: f'https://clips-media-assets2.twitch.tv/{i}.mp4'
+                for i, clip in enumerate(example_clip_list)}
+    mocker.patch('clipsplice.ClipSplicer._get_clip_src_urls',
+                 return_value=(src_urls, {}))
+    mocker.patch('clipsplice.ClipSplicer._download_clip')
+
+    splicer = ClipSplicer(clips, max_workers=4)
+    fail_list = splicer._download_clips('./')
+    assert fail_list == []
+    assert splicer.clips_list == clips
+    assert splicer._download_clip.call_count == 2
+    splicer._get_clip_src_urls.assert_called_once_with(
+        [clip['id'] for clip in example_clip_list])
+
+def test__download_clips_iterator_duplicate_clips_downloaded_once(mocker):
+    clips = [example_clip_list[0], dict(example_clip_list[0]),
+             example_clip_list[1]]
+    src_urls = {clip['id']: f'https://clips-media-assets2.twitch.tv/{i}.mp4'
+                for i, clip in enumerate(example_clip_list)}
+    mocker.patch('clipsplice.ClipSplicer._get_clip_src_urls',
+                 return_value=(src_urls, {}))
+    mocker.patch('clipsplice.ClipSplicer._download_clip')
+
+    splicer = ClipSplicer(iter(clips), max_workers=4)
+    fail_list = splicer._download_clips('./')
+    assert fail_list == []
+    assert splicer.clips_list == clips
+    assert splicer._download_clip.call_count == 2
@@ -0,0 +1,55 @@
+"""Tests the cliptable module."""
+
+import numpy as np
+
+from cliptable import ClipTable, DEFAULT_VIDEO_VIEWS
+
+example_clips = [
+    {'id': 'Clip1', 'view_count': 250, 'video_id': '1', 'language': 'en',
+     'duration': 30.0},
+    {'id': 'Clip2', 'view_count': 150, 'video_id': '', 'language': 'es',
+     'duration': 12.5},
+    {'id': 'Clip3', 'view_count': 50, 'video_id': '2', 'language': 'en',
+     'duration': 60.0},
+    {'id': 'Clip4', 'view_count': 10, 'video_id': '1', 'language': 'de',
+     'duration': 5.0},
+]
+
+def test___init___clips_ret_columns():
+    table = ClipTable(example_clips)
+    assert len(table) == 4
+    assert table.view_counts.tolist() == [250, 150, 50, 10]
+    assert table.video_views.tolist() == [DEFAULT_VIDEO_VIEWS] * 4
+
+def test_in_lang_no_lang_ret_all_clips():
+    table = ClipTable(example_clips)
+    assert table.in_lang().tolist() == [True, True, True, True]
+
+def test_in_lang_many_langs_ret_clips_in_langs():
+    table = ClipTable(example_clips)
+    assert table.in_lang({'en', 'de'}).tolist() == [True, False, True, True]
+
+def test_get_video_ids_mask_ret_unique_ids_without_empty():
+    table = ClipTable(example_clips)
+    assert table.get_video_ids(np.ones(4, dtype=bool)) == ['1', '2']
+    assert table.get_video_ids(table.in_lang({'es', 'de'})) == ['1']
+
+def test_set_video_views_missing_videos_ret_default():
+    table = ClipTable(example_clips)
+    table.set_video_views({'1': 45})
+    assert table.video_views.tolist() == [45, DEFAULT_VIDEO_VIEWS,
+                                          DEFAULT_VIDEO_VIEWS, 45]
+
+def test_set_ratings_and_select_mask_ret_clips_in_mask():
+    clips = [dict(clip) for clip in example_clips]
+    table = ClipTable(clips)
+    mask = np.array([True, False, True, False])
+    table.set_ratings(np.array([1.5, 2.0, 0.5, 3.0]), mask)
+    assert [clip.get('rating') for clip in clips] == [1.5, None, 0.5, None]
+    assert table.select(mask) == [clips[0], clips[2]]
+
+def test___init___no_clips_ret_empty_table():
+    table = ClipTable([])
+    table.set_video_views({})
+    assert len(table) == 0
+    assert table.select(table.in_lang({'en'})) == []
@@ -0,0 +1,29 @@
+"""Tests the encoding module."""
+
+from encoding import get_write_kwargs
+
+def test_get_write_kwargs_default_avi_ret_png():
+    kwargs = get_write_kwargs('result.avi')
+    assert kwargs['codec'] == 'png'
+    assert 'threads' not in kwargs
+
+def test_get_write_kwargs_default_mp4_ret_moviepy_codec():
+    assert 'codec' not in get_write_kwargs('result.mp4')
+
+def test_get_write_kwargs_fast_mp4_ret_crf_and_all_threads(mocker):
+    mocker.patch('encoding.os.cpu_count', return_value=8)
+    kwargs = get_write_kwargs('result.mp4', 'fast')
+    assert kwargs['codec'] == 'libx264'
+    assert kwargs['preset'] == 'veryfast'
+    assert kwargs['ffmpeg_params'] == ['-crf', '23']
+    assert kwargs['audio_codec'] == 'aac'
+    assert kwargs['threads'] == 8
+
+def test_get_write_kwargs_fast_avi_ret_ffv1():
+    kwargs = get_write_kwargs('RESULT.AVI', 'fast')
+    assert kwargs['codec'] == 'ffv1'
+    assert kwargs['audio_codec'] == 'pcm_s16le'
+    assert '-crf' not in kwargs['ffmpeg_params']
+
+def test_get_write_kwargs_threads_overrides_profile():
+    assert get_write_kwargs('result.mp4', 'fast', threads=2)['threads'] == 2
@@ -0,0 +1,57 @@
+"""Tests the ffmpegtools module."""
+
+import subprocess
+
+from moviepy.config import get_setting
+import pytest
+
+from ffmpegtools import (_concat_list_entry, _parse_probe_output,
+                         concat_copy, probe, VideoInfo)
+
+example_probe_output = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'a.mp4':
+  Duration: 00:00:30.02, start: 0.000000, bitrate: 6210 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(tv, bt709, progressive), 1920x1080 [SAR 1:1 DAR 16:9], 6075 kb/s, 60 fps, 60 tbr, 15360 tbn (default)
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 48000 Hz, stereo, fltp, 128 kb/s (default)
+At least one output file must be specified
+"""
+
+example_probe_output_no_audio = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'b.mp4':
+  Stream #0:0(und): Video: h264 (Main) (avc1 / 0x31637661), yuv420p, 1280x720, 3000 kb/s, 29.97 fps, 29.97 tbr, 90k tbn, 59.94 tbc (default)
+"""
+
+def _make_clip(file_name, size='64x36'):
+    subprocess.run([get_setting('FFMPEG_BINARY'), '-hide_banner', '-loglevel',
+                    'error', '-y', '-f', 'lavfi', '-i',
+                    f'testsrc=size={size}:rate=30', '-f', 'lavfi', '-i',
+                    'sine=sample_rate=48000', '-t', '1', '-c:v', 'libx264',
+                    '-pix_fmt', 'yuv420p', '-c:a', 'aac', file_name],
+                   check=True)
+
+def test__parse_probe_output_video_and_audio_ret_info():
+    info = _parse_probe_output(example_probe_output)
+    assert info == VideoInfo('h264', 'High', 'yuv420p', 1920, 1080, 60.0,
+                             'aac', 48000, 'stereo')
+
+def test__parse_probe_output_no_audio_ret_info():
+    info = _parse_probe_output(example_probe_output_no_audio)
+    assert info == VideoInfo('h264', 'Main', 'yuv420p', 1280, 720, 29.97,
+                             None, None, None)
+
+def test__parse_probe_output_no_video_throws_exception():
+    with pytest.raises(ValueError):
+        _parse_probe_output("a.mp4: Invalid data found when processing "
+                            "input")
+
+def test__concat_list_entry_quote_in_name_escaped():
+    entry = _concat_list_entry("/tmp/it's.mp4")
+    assert entry == "file '/tmp/it'\\''s.mp4'\n"
+
+def test_concat_copy_same_clips_joined(tmp_path):
+    file_names = [f'{tmp_path}/a.mp4', f'{tmp_path}/b.mp4']
+    for file_name in file_names:
+        _make_clip(file_name)
+
+    concat_copy(file_names, f'{tmp_path}/result.mp4')
+    info = probe(f'{tmp_path}/result.mp4')
+    assert (info.width, info.height) == (64, 36)
+    assert info.audio_codec == 'aac'
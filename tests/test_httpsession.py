@@ -0,0 +1,71 @@
+"""Tests the httpsession module."""
+
+import time
+
+import responses
+
+from constants import BASE_GQL_URL, BASE_HELIX_URL
+from httpsession import create_session
+from metrics import Metrics
+from ratelimit import RateLimiter
+
+def test_create_session_pool_maxsize_sets_adapters():
+    session = create_session(pool_maxsize=16)
+    for prefix in ('https://', 'http://'):
+        adapter = session.get_adapter(f'{prefix}api.twitch.tv')
+        assert adapter._pool_maxsize == 16
+
+def test_create_session_same_host_shares_adapter():
+    session = create_session()
+    assert (session.get_adapter('https://api.twitch.tv/helix/clips')
+            is session.get_adapter('https://gql.twitch.tv/gql'))
+
+@responses.activate
+def test_create_session_rate_limiter_retries_429():
+    responses.add(responses.GET,
+                  f'{BASE_HELIX_URL}/clips',
+                  status=429,
+                  headers={'Ratelimit-Limit': '800',
+                           'Ratelimit-Remaining': '0',
+                           'Ratelimit-Reset': str(int(time.time()))})
+    responses.add(responses.GET,
+                  f'{BASE_HELIX_URL}/clips',
+                  body='{"data": []}',
+                  status=200,
+                  headers={'Ratelimit-Limit': '800',
+                           'Ratelimit-Remaining': '799'})
+
+    session = create_session(rate_limiter=RateLimiter())
+    resp = session.get(f'{BASE_HELIX_URL}/clips')
+    assert resp.status_code == 200
+    assert len(responses.calls) == 2
+
+@responses.activate
+def test_create_session_rate_limiter_ignores_other_hosts():
+    rate_limiter = RateLimiter()
+    responses.add(responses.POST, BASE_GQL_URL, body='[]', status=200)
+
+    session = create_session(rate_limiter=rate_limiter)
+    session.post(BASE_GQL_URL)
+    assert rate_limiter.budget == 800
+
+def test_rate_limited_session_429_closes_response_before_retry(mocker):
+    rate_limited = mocker.Mock(status_code=429, headers={})
+    ok = mocker.Mock(status_code=200, headers={})
+    mocker.patch('requests.Session.request', side_effect=[rate_limited, ok])
+
+    session = create_session(rate_limiter=RateLimiter())
+    resp = session.get(f'{BASE_HELIX_URL}/clips')
+    assert resp is ok
+    rate_limited.close.assert_called_once_with()
+    ok.close.assert_not_called()
+
+@responses.activate
+def test_create_session_metrics_counts_responses():
+    responses.add(responses.POST, BASE_GQL_URL, body='[]', status=200)
+    metrics = Metrics()
+
+    session = create_session(metrics=metrics)
+    session.post(BASE_GQL_URL)
+    assert metrics.http['gql.twitch.tv/gql']['requests'] == 1
+    assert metrics.http['gql.twitch.tv/gql']['statuses'] == {'200': 1}
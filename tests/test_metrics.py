@@ -0,0 +1,67 @@
+"""Tests the metrics module."""
+
+import json
+
+import pytest
+
+from metrics import Metrics
+
+def test_span_many_spans_adds_up(mocker):
+    mocker.patch('metrics.time.perf_counter', side_effect=[0, 1.5, 2, 2.5])
+    metrics = Metrics()
+    with metrics.span('download'):
+        pass
+    with metrics.span('download'):
+        pass
+    assert metrics.stages == {'download': {'seconds': 2.0, 'count': 2}}
+
+def test_span_exception_still_timed():
+    metrics = Metrics()
+    with pytest.raises(ValueError):
+        with metrics.span('encode'):
+            raise ValueError
+    assert metrics.stages['encode']['count'] == 1
+
+def test_observe_request_clip_urls_one_endpoint():
+    metrics = Metrics()
+    metrics.observe_request('https://clips-media-assets2.twitch.tv/1.mp4',
+                            200, 0.5)
+    metrics.observe_request('https://clips-media-assets2.twitch.tv/2.mp4',
+                            404, 0.25)
+    assert metrics.http == {'clips-media-assets2.twitch.tv': {
+        'requests': 2, 'seconds': 0.75, 'max_seconds': 0.5,
+        'statuses': {'200': 1, '404': 1}}}
+
+def test_encode_fps_frames_and_encode_span_ret_fps():
+    metrics = Metrics()
+    metrics.add_span('encode', 2.0)
+    metrics.increment('encode_frames', 120)
+    assert metrics.encode_fps() == 60
+
+def test_encode_fps_nothing_encoded_ret_none():
+    assert Metrics().encode_fps() is None
+
+def test_write_json_saves_report(tmp_path):
+    metrics = Metrics()
+    metrics.add_span('fetch', 1.0)
+    metrics.increment('download_bytes', 1024)
+    metrics.write_json(f'{tmp_path}/metrics.json')
+    with open(f'{tmp_path}/metrics.json') as f:
+        report = json.load(f)
+    assert report['stages'] == {'fetch': {'seconds': 1.0, 'count': 1}}
+    assert report['counters'] == {'download_bytes': 1024}
+
+def test_write_prometheus_saves_samples(tmp_path):
+    metrics = Metrics()
+    metrics.add_span('fetch', 1.0)
+    metrics.observe_request('https://api.twitch.tv/helix/clips', 200, 0.5)
+    metrics.increment('download_bytes', 1024)
+    metrics.write_prometheus(f'{tmp_path}/clip9.prom')
+    with open(f'{tmp_path}/clip9.prom') as f:
+        lines = f.read().splitlines()
+    assert '# TYPE clip9_stage_seconds gauge' in lines
+    assert 'clip9_stage_seconds{stage="fetch"} 1.0' in lines
+    assert ('clip9_http_requests{endpoint="api.twitch.tv/helix/clips",'
+            'status="200"} 1') in lines
+    assert 'clip9_download_bytes 1024' in lines
+    assert [path.name for path in tmp_path.iterdir()] == ['clip9.prom']
@@ -1,6 +1,8 @@
 """Tests the oauthtoken module."""
 
 import json
+import os
+import time
 
 import pytest
 import requests
@@ -189,3 +191,114 @@ def test_revoke_invalid_token_fail(token):
 
     with pytest.raises(requests.HTTPError):
         token.revoke()
+
+@responses.activate
+def test_token_constructor_cache_file_saves_token(tmp_path):
+    cache_file = f'{tmp_path}/token.json'
+    responses.add(responses.POST,
+                  f'{BASE_OAUTH2_URL}/token',
+                  body=json.dumps(example_app_access_token_pass_resp),
+                  status=200,
+                  content_type='application/json')
+
+    token = OauthToken(example_client_id, example_client_secret,
+                       cache_file=cache_file)
+    assert token.token == example_app_access_token
+    assert os.stat(cache_file).st_mode & 0o777 == 0o600
+    with open(cache_file) as f:
+        assert json.load(f)['access_token'] == example_app_access_token
+
+@responses.activate
+def test_token_constructor_cached_token_no_request(tmp_path):
+    cache_file = f'{tmp_path}/token.json'
+    with open(cache_file, 'w') as f:
+        json.dump({'client_id': example_client_id,
+                   'access_token': 'cachedtoken',
+                   'expires_at': time.time() + 5184000,
+                   'validated_at': time.time()}, f)
+
+    token = OauthToken(example_client_id, example_client_secret,
+                       cache_file=cache_file)
+    assert token.token == 'cachedtoken'
+    assert token.validate() is True
+    assert len(responses.calls) == 0
+
+@responses.activate
+def test_token_constructor_cached_token_expiring_gets_new_token(tmp_path):
+    cache_file = f'{tmp_path}/token.json'
+    with open(cache_file, 'w') as f:
+        json.dump({'client_id': example_client_id,
+                   'access_token': 'cachedtoken',
+                   'expires_at': time.time() + 60,
+                   'validated_at': None}, f)
+    responses.add(responses.POST,
+                  f'{BASE_OAUTH2_URL}/token',
+                  body=json.dumps(example_app_access_token_pass_resp),
+                  status=200,
+                  content_type='application/json')
+
+    token = OauthToken(example_client_id, example_client_secret,
+                       cache_file=cache_file)
+    assert token.token == example_app_access_token
+
+@responses.activate
+def test_validate_cached_token_invalid_removes_cache(tmp_path):
+    cache_file = f'{tmp_path}/token.json'
+    with open(cache_file, 'w') as f:
+        json.dump({'client_id': example_client_id,
+                   'access_token': 'cachedtoken',
+                   'expires_at': time.time() + 5184000,
+                   'validated_at': None}, f)
+    responses.add(responses.GET,
+                  f'{BASE_OAUTH2_URL}/validate',
+                  body=json.dumps(example_token_validation_fail_resp),
+                  status=401,
+                  content_type='application/json')
+
+    token = OauthToken(example_client_id, example_client_secret,
+                       cache_file=cache_file)
+    assert token.validate() is False
+    assert not os.path.exists(cache_file)
+
+@pytest.mark.parametrize('cache', [
+    {'client_id': example_client_id, 'access_token': 'cachedtoken'},
+    {'client_id': example_client_id, 'access_token': 'cachedtoken',
+     'expires_at': None},
+    ['cachedtoken'],
+])
+@responses.activate
+def test_token_constructor_malformed_cache_gets_new_token(tmp_path, cache):
+    cache_file = f'{tmp_path}/token.json'
+    with open(cache_file, 'w') as f:
+        json.dump(cache, f)
+    responses.add(responses.POST,
+                  f'{BASE_OAUTH2_URL}/token',
+                  body=json.dumps(example_app_access_token_pass_resp),
+                  status=200,
+                  content_type='application/json')
+
+    token = OauthToken(example_client_id, example_client_secret,
+                       cache_file=cache_file)
+    assert token.token == example_app_access_token
+
+@responses.activate
+def test_refresh_revoked_cached_token_gets_new_token(tmp_path):
+    cache_file = f'{tmp_path}/token.json'
+    with open(cache_file, 'w') as f:
+        json.dump({'client_id': example_client_id,
+                   'access_token': 'cachedtoken',
+                   'expires_at': time.time() + 5184000,
+                   'validated_at': None}, f)
+    responses.add(responses.POST,
+                  f'{BASE_OAUTH2_URL}/token',
+                  body=json.dumps(example_app_access_token_pass_resp),
+                  status=200,
+                  content_type='application/json')
+
+    token = OauthToken(example_client_id, example_client_secret,
+                       cache_file=cache_file)
+    token.refresh()
+    assert token.token == example_app_access_token
+    assert os.listdir(tmp_path) == ['token.json']
+    with open(cache_file) as f:
+        assert json.load(f)['access_token'] == example_app_access_token
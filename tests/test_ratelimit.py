@@ -0,0 +1,47 @@
+"""Tests the ratelimit module."""
+
+import time
+
+from ratelimit import RateLimiter
+
+def test_acquire_full_bucket_takes_token():
+    limiter = RateLimiter(limit=60)
+    limiter.acquire()
+    assert limiter.budget == 59
+
+def test_update_remaining_lowers_budget():
+    limiter = RateLimiter(limit=800)
+    limiter.update({'Ratelimit-Limit': '800', 'Ratelimit-Remaining': '10',
+                    'Ratelimit-Reset': str(int(time.time()) + 60)})
+    assert limiter.budget == 10
+
+def test_update_no_headers_keeps_budget():
+    limiter = RateLimiter(limit=800)
+    limiter.update({})
+    assert limiter.budget == 800
+
+def test_update_limit_changes_limit():
+    limiter = RateLimiter(limit=800)
+    limiter.update({'Ratelimit-Limit': '30', 'Ratelimit-Remaining': '30'})
+    assert limiter.limit == 30
+    assert limiter.budget == 30
+
+def test_acquire_used_up_waits_for_reset(mocker):
+    clock = mocker.Mock()
+    clock.time.return_value = clock.monotonic.return_value = 1000.0
+    mocker.patch('ratelimit.time', clock)
+    limiter = RateLimiter(limit=800)
+    limiter.update({'Ratelimit-Limit': '800', 'Ratelimit-Remaining': '0',
+                    'Ratelimit-Reset': '1002'})
+    assert limiter.budget == 0
+
+    waits = []
+    def wait(timeout):
+        waits.append((timeout, limiter.queue_depth))
+        clock.time.return_value += timeout
+        clock.monotonic.return_value += timeout
+    mocker.patch.object(limiter._cond, 'wait', side_effect=wait)
+    limiter.acquire()
+    assert waits == [(2.0, 1)]
+    assert limiter.queue_depth == 0
+    assert limiter.budget == 799
@@ -0,0 +1,22 @@
+"""Tests the timestamps module."""
+
+import pytest
+
+from timestamps import format_timestamp, parse_timestamp
+
+def test_parse_timestamp_rfc_3339_ret_unix_time():
+    assert parse_timestamp('1970-01-02T00:00:00Z') == 86400
+
+def test_format_timestamp_unix_time_ret_rfc_3339():
+    assert format_timestamp(86400) == '1970-01-02T00:00:00Z'
+
+def test_parse_timestamp_fraction_ret_unix_time():
+    assert parse_timestamp('1970-01-02T00:00:00.250Z') == 86400.25
+
+def test_parse_timestamp_offset_ret_unix_time():
+    assert parse_timestamp('1970-01-02T00:00:00+01:00') == 82800
+    assert parse_timestamp('1970-01-01T17:00:00-07:00') == 86400
+
+def test_parse_timestamp_not_rfc_3339_throws_exception():
+    with pytest.raises(ValueError):
+        parse_timestamp('1970-01-02')
@@ -0,0 +1,36 @@
+"""Tests the viewcache module."""
+
+import time
+
+from viewcache import ViewCountCache
+
+def _video(video_id, view_count, age):
+    created_at = time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                               time.gmtime(time.time() - age))
+    return {'id': video_id, 'view_count': view_count,
+            'created_at': created_at}
+
+def test_get_many_not_cached_ret_empty(tmp_path):
+    cache = ViewCountCache(f'{tmp_path}/views.db')
+    assert cache.get_many(['1234567']) == {}
+
+def test_get_many_fresh_ret_views(tmp_path):
+    cache = ViewCountCache(f'{tmp_path}/views.db')
+    cache.put_many([_video('1234567', 450, 3600)])
+    assert cache.get_many(['1234567', '7654321']) == {'1234567': 450}
+
+def test_get_many_expired_recent_video_ret_empty(tmp_path):
+    cache = ViewCountCache(f'{tmp_path}/views.db', ttl=0)
+    cache.put_many([_video('1234567', 450, 3600)])
+    assert cache.get_many(['1234567']) == {}
+
+def test_get_many_expired_old_video_ret_views(tmp_path):
+    cache = ViewCountCache(f'{tmp_path}/views.db', ttl=0, settled_age=60)
+    cache.put_many([_video('1234567', 450, 3600)])
+    assert cache.get_many(['1234567']) == {'1234567': 450}
+
+def test_put_many_new_cache_keeps_views(tmp_path):
+    ViewCountCache(f'{tmp_path}/views.db').put_many(
+        [_video('1234567', 450, 3600)])
+    cache = ViewCountCache(f'{tmp_path}/views.db')
+    assert cache.get_many(['1234567']) == {'1234567': 450}